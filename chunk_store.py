@@ -0,0 +1,215 @@
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+def _compact(values):
+    """Store a column in the smallest lossless typed form.
+
+    Returns (kind, array, categories): datetimes become int64 nanoseconds,
+    numbers are downcast where no value changes, and everything else is
+    dictionary-encoded as small integer codes into ``categories``.
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime', values.to_numpy(dtype='datetime64[ns]').view(np.int64), None
+    if pd.api.types.is_bool_dtype(values) or not pd.api.types.is_numeric_dtype(values):
+        codes, categories = pd.factorize(values)
+        code_type = np.min_scalar_type(-max(len(categories), 1))
+        return 'category', codes.astype(code_type), np.asarray(categories, dtype=object)
+    if pd.api.types.is_integer_dtype(values):
+        return 'number', pd.to_numeric(values, downcast='integer').to_numpy(), None
+
+    array = values.to_numpy(dtype=float)
+    compact = array.astype(np.float32)
+    if np.array_equal(compact.astype(float), array, equal_nan=True):
+        array = compact
+    return 'number', array, None
+
+
+class ChunkStore:
+    def __init__(self, texts, columns, ids=None):
+        """Hold RAG chunks as typed column arrays instead of one dict per chunk.
+
+        Texts are packed into one UTF-8 buffer with offsets, and each metadata
+        field is a compact column (see ``_compact``), so a chunk costs a few dozen
+        bytes beyond its text. ``source`` may be set to the frame the chunks were
+        built from to expose full rows as ``raw_data``; it is never persisted.
+        """
+        encoded = [str(text).encode('utf-8') for text in texts]
+        self.buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=self.offsets[1:])
+
+        ids = np.arange(len(encoded)) if ids is None else ids
+        self.columns = {'id': _compact(ids)}
+        for field, values in columns.items():
+            self.columns[field] = _compact(values)
+        self.fields = list(self.columns)
+        self.source = None
+
+    @classmethod
+    def from_frame(cls, data, fields, texts):
+        """Build a store from a frame, mapping chunk fields to frame columns."""
+        columns = {
+            field: data[column].to_numpy() if column in data.columns else np.full(len(data), '', dtype=object)
+            for field, column in fields.items()
+        }
+        store = cls(texts, columns, ids=data.index.to_numpy())
+        store.source = data
+        return store
+
+    def save(self, directory):
+        """Write the store as one ``.npy`` file per array plus a JSON column manifest."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'text_buffer.npy'), self.buffer)
+        np.save(os.path.join(directory, 'text_offsets.npy'), self.offsets)
+
+        manifest = {}
+        for field, (kind, array, categories) in self.columns.items():
+            np.save(os.path.join(directory, f'{field}.npy'), array)
+            manifest[field] = {
+                'kind': kind,
+                'categories': categories.tolist() if categories is not None else None
+            }
+        with open(os.path.join(directory, 'columns.json'), 'w') as f:
+            json.dump(manifest, f, default=str)
+
+    @classmethod
+    def load(cls, directory):
+        """Map a saved store read-only; nothing but the category lists is parsed."""
+        with open(os.path.join(directory, 'columns.json')) as f:
+            manifest = json.load(f)
+
+        store = cls.__new__(cls)
+        store.buffer = np.load(os.path.join(directory, 'text_buffer.npy'), mmap_mode='r')
+        store.offsets = np.load(os.path.join(directory, 'text_offsets.npy'), mmap_mode='r')
+        store.columns = {}
+        for field, column in manifest.items():
+            categories = column['categories']
+            store.columns[field] = (
+                column['kind'],
+                np.load(os.path.join(directory, f'{field}.npy'), mmap_mode='r'),
+                np.array(categories, dtype=object) if categories is not None else None
+            )
+        store.fields = list(store.columns)
+        store.source = None
+        return store
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text(self, row):
+        """Return the text of one chunk."""
+        return self.buffer[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+
+    def texts(self):
+        """Return all chunk texts as a list."""
+        data = self.buffer.tobytes()
+        return [data[start:end].decode('utf-8') for start, end in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def value(self, field, row):
+        """Return one metadata value as a plain Python object."""
+        kind, array, categories = self.columns[field]
+        if kind == 'category':
+            code = array[row]
+            return categories[code] if code >= 0 else np.nan
+        if kind == 'datetime':
+            return pd.Timestamp(array[row])
+        return array[row].item()
+
+    def column(self, field):
+        """Return one metadata field decoded for every chunk."""
+        kind, array, categories = self.columns[field]
+        if kind == 'category':
+            return np.where(array >= 0, categories[np.maximum(array, 0)], np.nan) if len(categories) else np.full(len(array), np.nan)
+        if kind == 'datetime':
+            return array.view('datetime64[ns]')
+        return array
+
+    def equals(self, field, values):
+        """Boolean mask of chunks whose field equals a value (or any of a list of values)."""
+        kind, array, categories = self.columns[field]
+        values = list(values) if isinstance(values, (list, tuple, set, np.ndarray)) else [values]
+        if kind == 'category':
+            codes = {value: code for code, value in enumerate(categories)}
+            values = [codes[value] for value in values if value in codes]
+        elif kind == 'datetime':
+            values = [pd.Timestamp(value).value for value in values]
+        return np.isin(array, values)
+
+    def contains(self, field, text):
+        """Boolean mask of chunks whose categorical field contains ``text`` (case-insensitive)."""
+        kind, array, categories = self.columns[field]
+        if kind != 'category':
+            raise ValueError(f"Field {field!r} is not categorical")
+        matches = pd.Series(categories, dtype=object).astype(str).str.lower().str.contains(text.lower(), regex=False)
+        return np.isin(array, np.flatnonzero(matches.to_numpy()))
+
+    def between(self, field, low=None, high=None):
+        """Boolean mask of chunks whose numeric or datetime field lies in [low, high]."""
+        kind, array, _ = self.columns[field]
+        if kind == 'category':
+            raise ValueError(f"Field {field!r} is categorical and has no order")
+        if kind == 'datetime':
+            low = pd.Timestamp(low).value if low is not None else None
+            high = pd.Timestamp(high).value if high is not None else None
+
+        mask = np.ones(len(array), dtype=bool)
+        if low is not None:
+            mask &= array >= low
+        if high is not None:
+            mask &= array <= high
+        return mask
+
+    def view(self, row, similarity_score=None):
+        """Return a lightweight read-only view of one chunk."""
+        return ChunkView(self, row, similarity_score)
+
+    def nbytes(self):
+        """Memory held by the packed texts and metadata columns."""
+        total = self.buffer.nbytes + self.offsets.nbytes
+        for _, array, categories in self.columns.values():
+            total += array.nbytes + (categories.nbytes if categories is not None else 0)
+        return total
+
+
+class ChunkView(Mapping):
+    """A dict-like view of one chunk that decodes fields on access."""
+    __slots__ = ('store', 'row', 'similarity_score')
+
+    def __init__(self, store, row, similarity_score=None):
+        self.store = store
+        self.row = int(row)
+        self.similarity_score = similarity_score
+
+    def _keys(self):
+        keys = ['text'] + self.store.fields
+        if self.store.source is not None:
+            keys.append('raw_data')
+        if self.similarity_score is not None:
+            keys.append('similarity_score')
+        return keys
+
+    def __getitem__(self, key):
+        if key == 'text':
+            return self.store.text(self.row)
+        if key == 'similarity_score' and self.similarity_score is not None:
+            return self.similarity_score
+        if key == 'raw_data' and self.store.source is not None:
+            return self.store.source.iloc[self.row].to_dict()
+        if key in self.store.columns:
+            return self.store.value(key, self.row)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return f"ChunkView(row={self.row}, text={self.store.text(self.row)[:60]!r})"
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+class CoRiderGraph:
+    def __init__(self, schema):
+        """Build the weighted user x user co-rider graph from a TripSchema.
+
+        The check-in bridge already is a CSR trip x user incidence matrix B, so
+        the adjacency is the sparse product B^T B: entry (i, j) counts the trips
+        users i and j shared, and the diagonal counts each user's trips. The work
+        is the sum of squared group sizes, i.e. linear in check-ins for bounded
+        group sizes.
+        """
+        self.schema = schema
+        n_trips, n_users = len(schema.trips), len(schema.users)
+        self.incidence = sparse.csr_matrix(
+            (np.ones(len(schema.rider_positions), dtype=np.int32), schema.rider_positions, schema.offsets),
+            shape=(n_trips, n_users)
+        )
+
+        adjacency = (self.incidence.T @ self.incidence).tocsr()
+        self.trip_counts = adjacency.diagonal()
+        adjacency.setdiag(0)
+        adjacency.eliminate_zeros()
+        self.adjacency = adjacency
+
+    def companions(self, user_id, top_k=5):
+        """Return a rider's most frequent companions with their shared trip counts."""
+        if user_id not in self.schema.user_index:
+            return pd.DataFrame(columns=['User ID', 'Shared Trips'])
+
+        position = self.schema.user_index.get_loc(user_id)
+        start, end = self.adjacency.indptr[position], self.adjacency.indptr[position + 1]
+        neighbours = self.adjacency.indices[start:end]
+        weights = self.adjacency.data[start:end]
+
+        top = np.argsort(-weights, kind='stable')[:top_k]
+        companions = self.schema.users.iloc[neighbours[top]].reset_index(drop=True)
+        companions.insert(1, 'Shared Trips', weights[top])
+        return companions
+
+    def friend_groups(self, min_shared_trips=2, min_size=3):
+        """Find friend groups: connected riders who repeatedly share trips."""
+        strong = self.adjacency.multiply(self.adjacency >= min_shared_trips).tocsr()
+        strong.eliminate_zeros()
+        _, labels = connected_components(strong, directed=False)
+
+        sizes = np.bincount(labels)
+        members = np.flatnonzero(sizes[labels] >= min_size)
+        groups = pd.DataFrame({
+            'Group': labels[members],
+            'User ID': self.schema.users['User ID'].to_numpy()[members],
+            'Trips': self.trip_counts[members]
+        })
+        return groups.groupby('Group').agg(
+            Size=('User ID', 'size'),
+            Members=('User ID', list),
+            Trips=('Trips', 'sum')
+        ).sort_values('Size', ascending=False).reset_index(drop=True)
+
+    def trip_cohesion(self, min_shared_trips=2):
+        """Score each trip by the share of rider pairs who also ride together elsewhere.
+
+        For trip riders x, the repeat-pair count is x^T R x with R the adjacency
+        thresholded at ``min_shared_trips``, computed for all trips at once.
+        """
+        repeat = (self.adjacency >= min_shared_trips).astype(np.int32)
+        pair_hits = np.asarray((self.incidence @ repeat).multiply(self.incidence).sum(axis=1)).ravel()
+        riders = self.schema.rider_counts
+        pairs = riders * (riders - 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(pairs > 0, pair_hits / pairs, np.nan)
@@ -2,6 +2,14 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import re
+from spatial_index import project_to_meters, grid_dbscan, spatiotemporal_pairs, connected_components
+from map_tiles import TilePyramid, viewport_bounds
+from interval_index import IntervalTree
+from trip_schema import TripSchema, UserHistoryIndex
+from corider_graph import CoRiderGraph
+from rider_similarity import RiderSimilarity
+
+AGE_GROUPS = ['Under 18', '18-24', '25-30', '31-40', 'Over 40', 'Unknown']
 
 class FetiiDataProcessor:
     def __init__(self, excel_file_path):
@@ -10,7 +18,16 @@ class FetiiDataProcessor:
         self.trip_data = None
         self.rider_data = None
         self.demo_data = None
-        self.processed_data = None
+        self.schema = None
+        self.data_version = 0
+        self.user_history = None
+        self._processed_data = None
+        self._corider_graph = None
+        self._rider_similarity = None
+        self._hotspot_cache = {}
+        self._tile_pyramids = {}
+        self._event_cache = {}
+        self._cohort_cache = {}
         
     def load_data(self):
         """Load all three sheets from the Excel file."""
@@ -51,27 +68,71 @@ class FetiiDataProcessor:
         self.trip_data['Pick Up Category'] = self.trip_data['Pick Up Address Clean'].apply(self._categorize_location)
         self.trip_data['Drop Off Category'] = self.trip_data['Drop Off Address Clean'].apply(self._categorize_location)
         
-        # Merge with rider data to get all passengers per trip
-        trip_with_riders = self.trip_data.merge(
-            self.rider_data, 
-            on='Trip ID', 
-            how='left'
-        )
+        # Link vans booked together from the same pickup into convoys
+        self._assign_convoys()
         
-        # Merge with demographic data
-        self.processed_data = trip_with_riders.merge(
-            self.demo_data, 
-            on='User ID', 
-            how='left'
-        )
+        # Create group size categories
+        self.trip_data['Group Size Category'] = self.trip_data['Total Passengers'].apply(self._get_group_size_category)
+        
+        # Normalize into trips fact, rider check-in bridge and users dimension
+        self.schema = TripSchema(self.trip_data, self.rider_data, self.demo_data)
         
         # Create age groups
-        self.processed_data['Age Group'] = self.processed_data['Age'].apply(self._get_age_group)
+        self.schema.users['Age Group'] = self.schema.users['Age'].apply(self._get_age_group)
+        
+        # Precompute per-trip rider demographics onto the trips table
+        aggregates = self.schema.trip_rider_aggregates(AGE_GROUPS)
+        self.trip_data[aggregates.columns] = aggregates
+        
+        # Index each rider's trips by time with precomputed profile stats
+        self.user_history = UserHistoryIndex(
+            self.schema.users['User ID'].to_numpy()[self.schema.rider_positions],
+            self.trip_data,
+            self.schema.checkin_trips,
+            profile_columns={
+                'Top Pickup': 'Pick Up Address Clean',
+                'Top Drop Off': 'Drop Off Address Clean',
+                'Top Pickup Category': 'Pick Up Category',
+                'Top Drop Off Category': 'Drop Off Category'
+            }
+        )
         
-        # Create group size categories
-        self.processed_data['Group Size Category'] = self.processed_data['Total Passengers'].apply(self._get_group_size_category)
+        # The wide trip x rider frame is only built if something asks for it
+        self._processed_data = None
+        
+        # Derived results depend on the processed data, so drop any cached ones
+        self.data_version += 1
+        self._hotspot_cache = {}
+        self._tile_pyramids = {}
+        self._event_cache = {}
+        self._corider_graph = None
+        self._rider_similarity = None
         
-        print(f"Processed data shape: {self.processed_data.shape}")
+        print(f"Processed {len(self.trip_data)} trips, {len(self.schema.rider_positions)} rider check-ins, {len(self.schema.users)} users")
+    
+    @property
+    def processed_data(self):
+        """Wide trip x rider frame, materialized from the schema on first access."""
+        if self._processed_data is None and self.schema is not None:
+            self._processed_data = self.schema.wide_view()
+        return self._processed_data
+        
+    def _assign_convoys(self, radius_meters=50, window_minutes=10):
+        """Assign convoy IDs to trips picked up close together in space and time.
+        
+        Trips are linked when their pickups are within ``radius_meters`` and their
+        start times within ``window_minutes``; a convoy is a connected group of
+        linked trips. Solo trips form a convoy of size 1.
+        """
+        x, y = project_to_meters(self.trip_data['Pick Up Latitude'], self.trip_data['Pick Up Longitude'])
+        seconds = self.trip_data['Trip Date and Time'].values.astype('datetime64[s]').astype(np.int64)
+        
+        pair_i, pair_j = spatiotemporal_pairs(x, y, seconds, radius_meters, window_minutes * 60)
+        convoy_ids = connected_components(len(self.trip_data), pair_i, pair_j)
+        
+        self.trip_data['Convoy ID'] = convoy_ids
+        self.trip_data['Convoy Size'] = np.bincount(convoy_ids)[convoy_ids]
+        self.trip_data['Convoy Passengers'] = self.trip_data.groupby('Convoy ID')['Total Passengers'].transform('sum')
         
     def _clean_address(self, address):
         """Clean and standardize address strings."""
@@ -160,7 +221,7 @@ class FetiiDataProcessor:
     
     def get_data_summary(self):
         """Get a summary of the processed data."""
-        if self.processed_data is None:
+        if self.schema is None:
             return "Data not processed yet. Call process_data() first."
         
         summary = {
@@ -173,85 +234,419 @@ class FetiiDataProcessor:
             },
             'top_pickup_locations': self.trip_data['Pick Up Category'].value_counts().head(5).to_dict(),
             'top_dropoff_locations': self.trip_data['Drop Off Category'].value_counts().head(5).to_dict(),
-            'age_distribution': self.processed_data['Age Group'].value_counts().to_dict(),
-            'group_size_distribution': self.processed_data['Group Size Category'].value_counts().to_dict()
+            'age_distribution': self.schema.rider_level_counts(user_column='Age Group').to_dict(),
+            'group_size_distribution': self.schema.rider_level_counts(trip_column='Group Size Category').to_dict()
         }
         
         return summary
     
+    def get_user_profile(self, user_id):
+        """Get a rider's precomputed profile merged with their demographics."""
+        profile = self.user_history.profile(user_id)
+        if profile is None:
+            return None
+        
+        user = self.schema.user_row(user_id)
+        profile['Age'] = user['Age']
+        profile['Age Group'] = user['Age Group']
+        return profile
+    
+    def get_corider_graph(self):
+        """Get the co-rider graph, building it from the check-in bridge on first use."""
+        if self._corider_graph is None:
+            self._corider_graph = CoRiderGraph(self.schema)
+        return self._corider_graph
+    
+    def get_rider_similarity(self):
+        """Get the rider behaviour vectors, building them on first use."""
+        if self._rider_similarity is None:
+            self._rider_similarity = RiderSimilarity(self.schema)
+        return self._rider_similarity
+    
+    def get_cohort_retention(self, period='week', as_rate=True):
+        """Build a cohort retention table from riders' first-trip dates.
+        
+        Riders are grouped by the week or month of their first trip; column k counts
+        (or, with ``as_rate``, the share of) the cohort riding again k periods later.
+        Periods are integer codes, so the whole table is one bincount.
+        """
+        signature = (self.data_version, period, as_rate)
+        if signature in self._cohort_cache:
+            return self._cohort_cache[signature]
+        
+        def period_codes(timestamps):
+            if period == 'month':
+                return timestamps.year * 12 + timestamps.month - 1
+            # Weeks start on Monday; the epoch fell on a Thursday
+            return (timestamps.values.astype('datetime64[D]').astype(np.int64) + 3) // 7
+        
+        checkin_users = self.schema.rider_positions.astype(np.int64)
+        checkin_periods = np.asarray(period_codes(pd.DatetimeIndex(self.trip_data['Trip Date and Time'].values[self.schema.checkin_trips])))
+        
+        # Cohort of each rider is the period of their first trip
+        user_ids = self.schema.users['User ID'].to_numpy()[checkin_users]
+        first_seen = self.user_history.profiles['First Seen'].reindex(user_ids)
+        cohorts = np.asarray(period_codes(pd.DatetimeIndex(first_seen.values)))
+        
+        # Count each rider once per (cohort, periods since first trip)
+        first_cohort = cohorts.min()
+        cohort_codes = cohorts - first_cohort
+        offsets = checkin_periods - cohorts
+        n_offsets = int(offsets.max()) + 1
+        n_users = len(self.schema.users)
+        active = np.unique(checkin_users * n_offsets + offsets)
+        active_users, active_offsets = active // n_offsets, active % n_offsets
+        user_cohorts = np.zeros(n_users, dtype=np.int64)
+        user_cohorts[checkin_users] = cohort_codes
+        
+        n_cohorts = int(cohort_codes.max()) + 1
+        counts = np.bincount(
+            user_cohorts[active_users] * n_offsets + active_offsets,
+            minlength=n_cohorts * n_offsets
+        ).reshape(n_cohorts, n_offsets)
+        
+        if period == 'month':
+            labels = [f"{(first_cohort + i) // 12}-{(first_cohort + i) % 12 + 1:02d}" for i in range(n_cohorts)]
+        else:
+            labels = [str(np.datetime64(int((first_cohort + i) * 7 - 3), 'D')) for i in range(n_cohorts)]
+        
+        sizes = counts[:, 0]
+        values = counts / np.where(sizes > 0, sizes, 1)[:, None] if as_rate else counts
+        retention = pd.DataFrame(values, index=pd.Index(labels, name=f'Cohort {period.title()}'))
+        retention.insert(0, 'Cohort Size', sizes)
+        retention = retention[retention['Cohort Size'] > 0]
+        
+        self._cohort_cache[signature] = retention
+        return retention
+    
+    def find_hotspots(self, point='pickup', day_of_week=None, start_hour=None, end_hour=None,
+                      min_size=None, eps_meters=150, min_samples=5):
+        """Cluster pickup or drop-off coordinates into demand hot spots.
+        
+        Hour windows may wrap midnight (e.g. 22 to 2); trips after midnight then
+        count towards the previous day, so 'Saturday 10pm-2am' covers early Sunday.
+        Results are cached per filter signature until the data is reprocessed.
+        """
+        if self.trip_data is None or 'Hour' not in self.trip_data.columns:
+            return "Data not processed yet. Call process_data() first."
+        
+        signature = (point, day_of_week, start_hour, end_hour, min_size, eps_meters, min_samples)
+        if signature in self._hotspot_cache:
+            return self._hotspot_cache[signature]
+        
+        prefix = 'Drop Off' if point == 'dropoff' else 'Pick Up'
+        trips = self.trip_data
+        mask = pd.Series(True, index=trips.index)
+        
+        # Filter by hour window, attributing post-midnight trips to the night before
+        trip_days = trips['DayOfWeek']
+        if start_hour is not None and end_hour is not None:
+            if start_hour <= end_hour:
+                mask &= trips['Hour'].between(start_hour, end_hour - 1)
+            else:
+                mask &= (trips['Hour'] >= start_hour) | (trips['Hour'] < end_hour)
+                trip_days = (trips['Trip Date and Time'] - pd.Timedelta(hours=end_hour)).dt.day_name()
+        
+        if day_of_week:
+            mask &= trip_days == day_of_week
+        
+        if min_size:
+            mask &= trips['Total Passengers'] >= min_size
+        
+        trips = trips[mask]
+        x, y = project_to_meters(trips[f'{prefix} Latitude'], trips[f'{prefix} Longitude'])
+        labels = grid_dbscan(x, y, eps_meters, min_samples)
+        
+        clustered = trips.assign(Cluster=labels, _x=x, _y=y)
+        clustered = clustered[clustered['Cluster'] >= 0]
+        
+        hotspots = []
+        for cluster_id, group in clustered.groupby('Cluster'):
+            radius = np.sqrt((group['_x'] - group['_x'].mean()) ** 2 + (group['_y'] - group['_y'].mean()) ** 2).max()
+            hotspots.append({
+                'Cluster': cluster_id,
+                'Latitude': group[f'{prefix} Latitude'].mean(),
+                'Longitude': group[f'{prefix} Longitude'].mean(),
+                'Trips': len(group),
+                'Total Passengers': int(group['Total Passengers'].sum()),
+                'Radius (m)': round(float(radius), 1),
+                'Top Address': group[f'{prefix} Address Clean'].mode().iloc[0]
+            })
+        
+        columns = ['Cluster', 'Latitude', 'Longitude', 'Trips', 'Total Passengers', 'Radius (m)', 'Top Address']
+        result = pd.DataFrame(hotspots, columns=columns)
+        result = result.sort_values('Trips', ascending=False).reset_index(drop=True)
+        
+        self._hotspot_cache[signature] = result
+        return result
+    
+    def get_density_cells(self, point='pickup', zoom=12, bounds=None, center=None):
+        """Get aggregated trip density cells for a map zoom level.
+        
+        The per-zoom pyramid is built once per point type, so map interactions
+        only filter pre-aggregated cells instead of sending every trip to the browser.
+        Cells are clipped to ``bounds``, or to the default-sized view around a
+        (lat, lon) ``center``, so close zooms send only what is on screen.
+        """
+        if self.trip_data is None or 'Hour' not in self.trip_data.columns:
+            return "Data not processed yet. Call process_data() first."
+        
+        if point not in self._tile_pyramids:
+            prefix = 'Drop Off' if point == 'dropoff' else 'Pick Up'
+            self._tile_pyramids[point] = TilePyramid(
+                self.trip_data[f'{prefix} Latitude'],
+                self.trip_data[f'{prefix} Longitude'],
+                weights=self.trip_data['Total Passengers']
+            )
+        
+        if bounds is None and center is not None:
+            bounds = viewport_bounds(center[0], center[1], zoom)
+        return self._tile_pyramids[point].cells(zoom, bounds)
+    
+    def _venue_names(self, addresses):
+        """Reduce cleaned addresses to venue names (the part before the first comma)."""
+        return addresses.str.split(',').str[0].str.strip()
+    
+    def detect_event_windows(self, max_gap_minutes=45, min_trips=3):
+        """Detect event windows: bursts of drop-offs at the same venue.
+        
+        Drop-offs are sorted by venue and time and swept once; a burst ends when the
+        venue changes or arrivals pause for more than ``max_gap_minutes``. Doors are
+        approximated by the last arrival of the burst. The windows are stored in an
+        interval tree so later lookups never rescan the trip timestamps.
+        """
+        if self.trip_data is None or 'Hour' not in self.trip_data.columns:
+            return "Data not processed yet. Call process_data() first."
+        
+        signature = (max_gap_minutes, min_trips)
+        if signature in self._event_cache:
+            return self._event_cache[signature]['windows']
+        
+        venues = self._venue_names(self.trip_data['Drop Off Address Clean'])
+        venue_codes, venue_names = pd.factorize(venues)
+        times = self.trip_data['Trip Date and Time'].values.astype('datetime64[ns]').astype(np.int64)
+        
+        # Drop-offs without a venue get code -1 and must not form (or join) a burst
+        known = np.flatnonzero(venue_codes >= 0)
+        
+        # Sort once by venue then time, and break bursts at venue changes or long gaps
+        order = known[np.lexsort((times[known], venue_codes[known]))]
+        sorted_codes = venue_codes[order]
+        sorted_times = times[order]
+        max_gap = int(pd.Timedelta(minutes=max_gap_minutes).value)
+        breaks = np.ones(len(order), dtype=bool)
+        breaks[1:] = (np.diff(sorted_codes) != 0) | (np.diff(sorted_times) > max_gap)
+        burst_ids = np.cumsum(breaks) - 1
+        
+        bursts = pd.DataFrame({
+            'burst': burst_ids,
+            'venue': sorted_codes,
+            'time': sorted_times,
+            'passengers': self.trip_data['Total Passengers'].values[order]
+        }).groupby('burst').agg(
+            venue=('venue', 'first'),
+            start=('time', 'min'),
+            end=('time', 'max'),
+            trips=('time', 'size'),
+            passengers=('passengers', 'sum')
+        )
+        bursts = bursts[bursts['trips'] >= min_trips]
+        
+        windows = pd.DataFrame({
+            'Venue': venue_names[bursts['venue'].values],
+            'Start': pd.to_datetime(bursts['start'].values),
+            'Doors': pd.to_datetime(bursts['end'].values),
+            'Trips': bursts['trips'].values,
+            'Total Passengers': bursts['passengers'].values
+        })
+        windows.index.name = 'Event ID'
+        
+        self._event_cache[signature] = {
+            'windows': windows,
+            'tree': IntervalTree(bursts['start'].values, bursts['end'].values),
+            'lead_trees': {}
+        }
+        return windows
+    
+    def get_event_trips(self, venue=None, minutes_before_doors=None, max_gap_minutes=45, min_trips=3):
+        """Get drop-offs at a venue that fall inside its event windows.
+        
+        With ``minutes_before_doors`` the lookup uses the lead-up window
+        [doors - minutes, doors] instead of the detected arrival burst.
+        """
+        windows = self.detect_event_windows(max_gap_minutes, min_trips)
+        if isinstance(windows, str):
+            return windows
+        
+        cached = self._event_cache[(max_gap_minutes, min_trips)]
+        tree = cached['tree']
+        if minutes_before_doors:
+            if minutes_before_doors not in cached['lead_trees']:
+                doors = windows['Doors'].values.astype('datetime64[ns]').astype(np.int64)
+                lead = int(pd.Timedelta(minutes=minutes_before_doors).value)
+                cached['lead_trees'][minutes_before_doors] = IntervalTree(doors - lead, doors)
+            tree = cached['lead_trees'][minutes_before_doors]
+        
+        trips = self.trip_data
+        trip_venues = self._venue_names(trips['Drop Off Address Clean'])
+        if venue:
+            matches = trip_venues.str.lower().str.contains(venue.lower(), na=False, regex=False)
+            trips = trips[matches]
+            trip_venues = trip_venues[matches]
+        
+        times = trips['Trip Date and Time'].values.astype('datetime64[ns]').astype(np.int64)
+        trip_positions, event_ids = tree.stab(times)
+        
+        # Keep only arrivals at the venue the event window belongs to
+        same_venue = trip_venues.values[trip_positions] == windows['Venue'].values[event_ids]
+        trip_positions, event_ids = trip_positions[same_venue], event_ids[same_venue]
+        
+        event_trips = trips.iloc[trip_positions].copy()
+        event_trips['Event ID'] = event_ids
+        event_trips['Event Start'] = windows['Start'].values[event_ids]
+        event_trips['Doors'] = windows['Doors'].values[event_ids]
+        return event_trips.sort_values('Trip Date and Time')
+    
     def query_data(self, query_type, **kwargs):
         """Query the processed data based on different criteria."""
-        if self.processed_data is None:
+        if self.schema is None:
             return "Data not processed yet. Call process_data() first."
         
-        df = self.processed_data.copy()
+        trips = self.trip_data
+        
+        if query_type == "hotspots":
+            return self.find_hotspots(**kwargs)
+        elif query_type == "density_map":
+            return self.get_density_cells(**kwargs)
+        elif query_type == "event_windows":
+            venue = kwargs.pop('venue', None)
+            windows = self.detect_event_windows(**kwargs)
+            if venue and not isinstance(windows, str):
+                windows = windows[windows['Venue'].str.lower().str.contains(venue.lower(), regex=False)]
+            return windows
+        elif query_type == "event_trips":
+            return self.get_event_trips(**kwargs)
+        elif query_type == "trip_demographics":
+            min_size = kwargs.get('min_size')
+            location = kwargs.get('location') or ''
+            
+            # Per-trip demographics are precomputed, so this is a plain trip filter
+            if min_size:
+                trips = trips[trips['Total Passengers'] >= min_size]
+            if location:
+                if 'downtown' in location.lower():
+                    trips = trips[trips['Drop Off Category'] == 'Downtown']
+                else:
+                    trips = trips[trips['Drop Off Address Clean'].str.lower().str.contains(location.lower(), na=False)]
+            
+            return trips.set_index('Trip ID').sort_index()
+        elif query_type == "companions":
+            return self.get_corider_graph().companions(kwargs.get('user_id'), kwargs.get('top_k', 5))
+        elif query_type == "friend_groups":
+            return self.get_corider_graph().friend_groups(**kwargs)
+        elif query_type == "group_cohesion":
+            cohesion = trips.assign(Cohesion=self.get_corider_graph().trip_cohesion(**kwargs))
+            return cohesion.groupby('Group Size Category').agg(
+                Trips=('Trip ID', 'size'),
+                Mean_Cohesion=('Cohesion', 'mean')
+            ).rename(columns={'Mean_Cohesion': 'Mean Cohesion'})
+        elif query_type == "similar_riders":
+            return self.get_rider_similarity().similar(kwargs.get('user_id'), kwargs.get('top_k', 10))
+        elif query_type == "similar_riders_batch":
+            return self.get_rider_similarity().similar_batch(kwargs.get('top_k', 10))
+        elif query_type == "cohort_retention":
+            return self.get_cohort_retention(**kwargs)
+        elif query_type == "convoys":
+            min_trips = kwargs.get('min_trips', 2)
+            trips = self.trip_data[self.trip_data['Convoy Size'] >= min_trips]
+            return trips.groupby('Convoy ID').agg(
+                Trips=('Trip ID', 'size'),
+                Passengers=('Total Passengers', 'sum'),
+                First_Pickup=('Trip Date and Time', 'min'),
+                Last_Pickup=('Trip Date and Time', 'max'),
+                Pickup_Address=('Pick Up Address Clean', 'first'),
+                Drop_Off_Category=('Drop Off Category', 'first')
+            ).rename(columns=lambda column: column.replace('_', ' ')).sort_values('Passengers', ascending=False)
         
         if query_type == "specific_user":
             user_id = kwargs.get('user_id')
             if user_id:
-                # Filter by specific user ID
-                df = df[df['User ID'] == user_id]
-            return df
+                # One row per trip the user checked in on, latest first
+                rows = self.user_history.history(user_id).reset_index(drop=True)
+                user = self.schema.user_row(user_id)
+                if user is not None:
+                    for column, value in user.items():
+                        rows[column] = value
+                return rows
+            return self.processed_data
+        
+        elif query_type == "user_profile":
+            return self.get_user_profile(kwargs.get('user_id'))
         
         elif query_type == "trips_to_location":
-            location = kwargs.get('location', '').lower()
+            location = (kwargs.get('location') or '').lower()
             time_period = kwargs.get('time_period', 'all')
             
             # Filter by location
             if location:
-                df = df[df['Drop Off Address Clean'].str.lower().str.contains(location, na=False)]
+                trips = trips[trips['Drop Off Address Clean'].str.lower().str.contains(location, na=False)]
             
             # Filter by time period
             if time_period == 'last_month':
                 cutoff_date = datetime.now() - timedelta(days=30)
-                df = df[df['Trip Date and Time'] >= cutoff_date]
+                trips = trips[trips['Trip Date and Time'] >= cutoff_date]
             elif time_period == 'last_week':
                 cutoff_date = datetime.now() - timedelta(days=7)
-                df = df[df['Trip Date and Time'] >= cutoff_date]
+                trips = trips[trips['Trip Date and Time'] >= cutoff_date]
             
-            return df.groupby('Trip ID').first()  # Get unique trips
+            return trips.set_index('Trip ID').sort_index()
         
         elif query_type == "demographic_analysis":
             age_group = kwargs.get('age_group', '')
             day_of_week = kwargs.get('day_of_week', '')
             time_of_day = kwargs.get('time_of_day', '')
             
-            # Filter by age group
-            if age_group:
-                df = df[df['Age Group'] == age_group]
+            # Filter trips first, then expand only the matching trips to riders
+            mask = pd.Series(True, index=trips.index)
             
             # Filter by day of week
             if day_of_week:
-                df = df[df['DayOfWeek'] == day_of_week]
+                mask &= trips['DayOfWeek'] == day_of_week
             
             # Filter by time of day
             if time_of_day == 'night':
-                df = df[df['Hour'].between(18, 23)]
+                mask &= trips['Hour'].between(18, 23)
             elif time_of_day == 'morning':
-                df = df[df['Hour'].between(6, 11)]
+                mask &= trips['Hour'].between(6, 11)
             elif time_of_day == 'afternoon':
-                df = df[df['Hour'].between(12, 17)]
+                mask &= trips['Hour'].between(12, 17)
+            
+            df = self.schema.wide_view(mask.values)
+            
+            # Filter by age group
+            if age_group:
+                df = df[df['Age Group'] == age_group]
             
             return df
         
         elif query_type == "group_size_analysis":
             min_size = kwargs.get('min_size', 6)
-            location = kwargs.get('location', '')
+            location = kwargs.get('location') or ''
             
             # Filter by group size
-            df = df[df['Total Passengers'] >= min_size]
+            trips = trips[trips['Total Passengers'] >= min_size]
             
             # Filter by location if specified
             if location:
                 location_lower = location.lower()
                 if 'downtown' in location_lower:
-                    df = df[df['Drop Off Category'] == 'Downtown']
+                    trips = trips[trips['Drop Off Category'] == 'Downtown']
                 else:
-                    df = df[df['Drop Off Address Clean'].str.lower().str.contains(location, na=False)]
+                    trips = trips[trips['Drop Off Address Clean'].str.lower().str.contains(location_lower, na=False)]
             
-            return df.groupby('Trip ID').first()  # Get unique trips
+            return trips.set_index('Trip ID').sort_index()
         
-        return df
+        return self.processed_data
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,217 @@
+import atexit
+import glob
+import hashlib
+import os
+import uuid
+import weakref
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+KEY_BYTES = 16
+
+
+def text_keys(model_name, texts):
+    """Content-address each text as a fixed-width hash of (model name, text)."""
+    prefix = hashlib.blake2b(model_name.encode('utf-8'), digest_size=KEY_BYTES).digest()
+    return np.array(
+        [hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_BYTES, key=prefix).digest() for text in texts],
+        dtype=f'S{KEY_BYTES}'
+    )
+
+
+class EmbeddingCache:
+    def __init__(self, directory, model_name):
+        """On-disk embedding cache keyed by hash(model name, text).
+
+        Entries are written as append-only ``.npz`` segments holding both the
+        keys and the vectors, each under a name unique to its writer. In memory the keys are kept sorted so a whole batch is looked up
+        with one binary search instead of a dict probe per text. Segments are
+        read on the first lookup, so a cache that is never consulted (e.g. by a
+        system restored with ``load_system``) costs nothing.
+        """
+        self.directory = directory
+        self.model_name = model_name
+        self.keys = np.array([], dtype=f'S{KEY_BYTES}')
+        self.vectors = None
+        self.loaded = False
+
+    def _segments(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'segment-*.npz')))
+
+    def _load(self):
+        """Read every cached segment and sort the keys for lookups, once."""
+        if self.loaded:
+            return
+        self.loaded = True
+        keys, vectors = [], []
+        for segment in self._segments():
+            try:
+                with np.load(segment) as saved:
+                    segment_keys, segment_vectors = saved['keys'], saved['vectors']
+            except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+                continue
+            # A segment whose keys and vectors disagree would poison every later lookup
+            if len(segment_keys) != len(segment_vectors):
+                continue
+            keys.append(segment_keys)
+            vectors.append(segment_vectors)
+
+        if keys:
+            self._merge(np.concatenate(keys), np.concatenate(vectors))
+
+    def _merge(self, keys, vectors):
+        """Add entries to the in-memory index, keeping keys sorted and unique."""
+        if self.vectors is not None:
+            keys = np.concatenate([self.keys, keys])
+            vectors = np.concatenate([self.vectors, vectors])
+        keys, first = np.unique(keys, return_index=True)
+        self.keys, self.vectors = keys, vectors[first]
+
+    def _write_segment(self, keys, vectors):
+        """Append one segment, renamed into place so readers never see a partial write.
+
+        The name is unique per writer, so concurrent processes never pick the
+        same segment or pair one writer's keys with another's vectors.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'segment-{os.getpid()}-{uuid.uuid4().hex}.npz')
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, keys=keys, vectors=vectors)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self):
+        self._load()
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """Return (found mask, positions into ``self.vectors``) for sorted-key lookups."""
+        self._load()
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return found, positions
+
+    def encode(self, texts, encoder):
+        """Embed ``texts``, calling ``encoder`` only for texts not cached yet.
+
+        Identical texts in the batch are encoded once. Returns one float32 row
+        per input text, in input order.
+        """
+        keys = text_keys(self.model_name, texts)
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        found, positions = self.lookup(unique_keys)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            print(f"Encoding {len(missing)} new texts ({len(unique_keys) - len(missing)} cached, {len(texts) - len(unique_keys)} duplicates)")
+            new_vectors = np.asarray(encoder([texts[i] for i in first[missing]]), dtype=np.float32)
+            self._write_segment(unique_keys[missing], new_vectors)
+            self._merge(unique_keys[missing], new_vectors)
+            found, positions = self.lookup(unique_keys)
+        else:
+            print(f"All {len(unique_keys)} unique texts found in embedding cache")
+
+        return self.vectors[positions][inverse]
+
+
+def normalize_query(query):
+    """Cache key for a query: case-folded with collapsed whitespace.
+
+    MiniLM's tokenizer lower-cases its input, so case never changes the embedding.
+    """
+    return ' '.join(str(query).lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, model_name, max_size=1024, path=None, save_every=32):
+        """Bounded LRU cache of normalized query -> normalized query embedding.
+
+        With ``path`` set, entries are reloaded from ``<path>.npz`` on start, for
+        the same model only, and written back after every ``save_every`` new
+        entries and at interpreter exit rather than on each miss.
+        """
+        self.model_name = model_name
+        self.max_size = max_size
+        self.path = path
+        self.save_every = save_every
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._unsaved = 0
+        if path:
+            self._load()
+            atexit.register(_save_on_exit, weakref.ref(self))
+
+    def _load(self):
+        if not os.path.exists(self.path + '.npz'):
+            return
+        try:
+            with np.load(self.path + '.npz') as saved:
+                model_name, queries, vectors = str(saved['model_name']), saved['queries'], saved['vectors']
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return
+        # A file whose queries and vectors disagree would pair queries with the wrong embeddings
+        if model_name != self.model_name or len(queries) != len(vectors):
+            return
+        for query, vector in zip(queries[-self.max_size:], vectors[-self.max_size:]):
+            self.entries[str(query)] = vector
+
+    def save(self):
+        """Write the cache to disk, oldest entries first.
+
+        Queries and vectors go to one file under a name unique to this writer,
+        swapped into place with a single rename, so concurrent sessions sharing
+        ``path`` never leave a mismatched pair behind.
+        """
+        if not self.path or not self.entries:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}-{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'wb') as f:
+            np.savez(f, model_name=np.array(self.model_name), queries=np.array(list(self.entries), dtype=str),
+                     vectors=np.stack(list(self.entries.values())))
+        os.replace(temporary, self.path + '.npz')
+        self._unsaved = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, query, encoder):
+        """Return the embedding of ``query`` as a (1, d) array, encoding it on a miss."""
+        return self.get_many([query], lambda keys: [encoder(keys[0])])
+
+    def get_many(self, queries, encoder):
+        """Return the embeddings of ``queries`` as an (n, d) array.
+
+        ``encoder`` is called once with the list of distinct normalized queries
+        that missed, and returns one vector per query.
+        """
+        keys = [normalize_query(query) for query in queries]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.entries))
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        vectors = {key: self.entries[key] for key in keys if key in self.entries}
+        for key in vectors:
+            self.entries.move_to_end(key)
+        if missing:
+            new_vectors = np.asarray(encoder(missing), dtype=np.float32).reshape(len(missing), -1)
+            for key, vector in zip(missing, new_vectors):
+                vectors[key] = self.entries[key] = vector
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self._unsaved += len(missing)
+            if self._unsaved >= self.save_every:
+                self.save()
+        return np.stack([vectors[key] for key in keys])
+
+
+def _save_on_exit(cache_ref):
+    """Flush a query cache at exit, unless it was garbage collected first."""
+    cache = cache_ref()
+    if cache is not None and cache._unsaved:
+        cache.save()
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+from text_index import tokenize
+
+ENCODER_BACKENDS = ('torch', 'onnx', 'onnx-int8', 'hashing')
+
+
+def encoder_id(model_name, backend='torch'):
+    """Identify the vectors an encoder produces, for cache keys and saved systems.
+
+    A full-precision ONNX export matches PyTorch to float rounding, so both share
+    the model name; other backends get their own id.
+    """
+    if backend == 'hashing':
+        return 'hashing'
+    return model_name if backend in ('torch', 'onnx') else f'{model_name}#{backend}'
+
+
+class TorchEncoder:
+    def __init__(self, model_name, threads=None):
+        """The reference sentence-transformers encoder running on PyTorch."""
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device='cpu')
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True)
+
+
+def export_onnx(model_name, output_dir, quantize=True):
+    """Export a sentence-transformers model to ONNX, plus a dynamic int8 copy.
+
+    Only the transformer runs in ONNX; pooling and normalization are recorded
+    in ``encoder.json`` and applied in numpy by OnnxEncoder. Needs torch and
+    the onnx package once, at export time.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+
+    class _HiddenStates(torch.nn.Module):
+        """Call the transformer with named inputs so the trace passes them as keywords."""
+        def __init__(self, transformer, input_names):
+            super().__init__()
+            self.transformer = transformer
+            self.input_names = input_names
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+    sample = tokenizer(['export sample'], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'tokens'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'tokens'}
+    model_path = os.path.join(output_dir, 'model.onnx')
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer, input_names), tuple(sample[name] for name in input_names), model_path,
+            input_names=input_names, output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes, opset_version=14, dynamo=False
+        )
+
+    # Older sentence-transformers releases flag each pooling mode separately
+    pooling = next((module.get_config_dict() for module in model if isinstance(module, models.Pooling)), {})
+    cls_pooling = pooling.get('pooling_mode') == 'cls' or pooling.get('pooling_mode_cls_token', False)
+    with open(os.path.join(output_dir, 'encoder.json'), 'w') as f:
+        json.dump({
+            'model_name': model_name,
+            'pooling': 'cls' if cls_pooling else 'mean',
+            'normalize': any(isinstance(module, models.Normalize) for module in model),
+            'max_seq_length': model.max_seq_length,
+            'inputs': input_names
+        }, f)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, 'model_int8.onnx'), weight_type=QuantType.QInt8)
+
+
+class OnnxEncoder:
+    def __init__(self, model_dir, quantized=False, threads=None):
+        """Run an exported encoder with onnxruntime on CPU.
+
+        Uses the int8 model when ``quantized``; ``threads`` caps intra-op threads.
+        Texts are batched in length order so padding stays short in bulk builds.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, 'encoder.json')) as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(self.config['max_seq_length'])
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = 'model_int8.onnx' if quantized else 'model.onnx'
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=['CPUExecutionProvider']
+        )
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+        order = np.argsort(lengths, kind='stable')
+        embeddings = None
+
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[i] for i in batch])
+            feeds = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {name: feeds[name] for name in self.config['inputs']})[0]
+
+            if self.config['pooling'] == 'cls':
+                pooled = hidden[:, 0]
+            else:
+                mask = feeds['attention_mask'][:, :, None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if self.config['normalize']:
+                pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
+
+        return embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+
+class HashingEncoder:
+    def __init__(self, n_features=4096, svd_components=None, seed=0):
+        """Dependency-free TF-IDF encoder over hashed word unigrams and bigrams.
+
+        Terms are hashed into ``n_features`` buckets, so there is no vocabulary
+        to store or download. ``fit`` learns the IDF weights and, with
+        ``svd_components`` set, a truncated SVD projection down to that many
+        dimensions; ``encode`` then returns L2-normalized dense vectors.
+        """
+        self.n_features = n_features
+        self.svd_components = svd_components
+        self.seed = seed
+        self.idf = None
+        self.components = None
+        self._buckets = {}
+
+    def _bucket(self, term):
+        # A keyed hash rather than hash(), which changes between processes
+        bucket = self._buckets.get(term)
+        if bucket is None:
+            digest = hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest()
+            bucket = self._buckets[term] = int.from_bytes(digest, 'little') % self.n_features
+        return bucket
+
+    def _term_counts(self, texts):
+        """Sparse (texts x buckets) matrix of term counts."""
+        rows, buckets = [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            terms = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+            rows.extend([row] * len(terms))
+            buckets.extend(self._bucket(term) for term in terms)
+        counts = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, buckets)),
+            shape=(len(texts), self.n_features)
+        )
+        counts.sum_duplicates()
+        return counts
+
+    def _tf_idf(self, texts):
+        counts = self._term_counts(texts)
+        counts.data = 1 + np.log(counts.data)
+        return counts.multiply(self.idf[None, :]).tocsr()
+
+    def fit(self, texts):
+        """Learn IDF weights (and the SVD projection) from a corpus."""
+        counts = self._term_counts(texts)
+        document_frequency = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        self.components = None
+        if self.svd_components:
+            from scipy.sparse.linalg import svds
+            matrix = self._tf_idf(texts)
+            k = min(self.svd_components, min(matrix.shape) - 1)
+            _, singular_values, vt = svds(matrix, k=k, random_state=self.seed)
+            self.components = np.ascontiguousarray(vt[np.argsort(-singular_values)], dtype=np.float32)
+        return self
+
+    @property
+    def dimension(self):
+        return len(self.components) if self.components is not None else self.n_features
+
+    def encode(self, texts, batch_size=None):
+        if self.idf is None:
+            raise RuntimeError("HashingEncoder must be fitted before encoding")
+        matrix = self._tf_idf(list(texts))
+        vectors = matrix @ self.components.T if self.components is not None else matrix.toarray()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def save(self, directory):
+        """Write the fitted IDF weights and projection as ``.npy`` files."""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'idf.npy'), self.idf)
+        if self.components is not None:
+            np.save(os.path.join(directory, 'components.npy'), self.components)
+        with open(os.path.join(directory, 'encoder.json'), 'w') as f:
+            json.dump({'n_features': self.n_features, 'svd_components': self.svd_components, 'seed': self.seed}, f)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, 'encoder.json')) as f:
+            encoder = cls(**json.load(f))
+        encoder.idf = np.load(os.path.join(directory, 'idf.npy'))
+        if os.path.exists(os.path.join(directory, 'components.npy')):
+            encoder.components = np.load(os.path.join(directory, 'components.npy'))
+        return encoder
+
+
+def create_encoder(model_name, backend='torch', threads=None, onnx_dir='onnx_models', params=None):
+    """Create an encoder for a backend, exporting the ONNX model on first use.
+
+    ``params`` are passed to the 'hashing' backend's HashingEncoder, which must
+    be fitted before it encodes.
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend {backend!r}; expected one of {ENCODER_BACKENDS}")
+    if backend == 'hashing':
+        return HashingEncoder(**(params or {}))
+    if backend == 'torch':
+        return TorchEncoder(model_name, threads)
+
+    model_dir = model_name if os.path.isdir(model_name) and os.path.exists(os.path.join(model_name, 'encoder.json')) \
+        else os.path.join(onnx_dir, model_name.replace('/', '__'))
+    if not os.path.exists(os.path.join(model_dir, 'encoder.json')):
+        print(f"Exporting {model_name} to ONNX in {model_dir}...")
+        export_onnx(model_name, model_dir)
+    return OnnxEncoder(model_dir, quantized=backend == 'onnx-int8', threads=threads)
+
+
+def cosine_agreement(reference, candidate, texts):
+    """Compare two encoders on the same texts; returns mean and minimum row cosine."""
+    a = np.asarray(reference.encode(texts), dtype=np.float32)
+    b = np.asarray(candidate.encode(texts), dtype=np.float32)
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {'mean': float(cosines.mean()), 'min': float(cosines.min())}
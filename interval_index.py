@@ -0,0 +1,113 @@
+import numpy as np
+
+
+class IntervalTree:
+    def __init__(self, starts, ends):
+        """Build a static centered interval tree over closed intervals [start, end].
+
+        Interval ids are their positions in ``starts``/``ends``. Each node keeps the
+        intervals containing its centre sorted by start and by end, so a stabbing
+        query only binary-searches one sorted array per level.
+        """
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.root = self._build(np.arange(len(self.starts)))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _build(self, ids):
+        """Recursively split intervals around the median endpoint."""
+        if len(ids) == 0:
+            return None
+
+        center = int(np.median(np.concatenate((self.starts[ids], self.ends[ids]))))
+        left = ids[self.ends[ids] < center]
+        right = ids[self.starts[ids] > center]
+        here = ids[(self.starts[ids] <= center) & (self.ends[ids] >= center)]
+
+        by_start = here[np.argsort(self.starts[here], kind='stable')]
+        by_end = here[np.argsort(self.ends[here], kind='stable')]
+        return {
+            'center': center,
+            'by_start': by_start,
+            'sorted_starts': self.starts[by_start],
+            'by_end': by_end,
+            'sorted_ends': self.ends[by_end],
+            'left': self._build(left),
+            'right': self._build(right),
+        }
+
+    def stab(self, points):
+        """Find every (point position, interval id) pair where the interval contains the point."""
+        points = np.asarray(points, dtype=np.int64)
+        point_ids, interval_ids = [], []
+        stack = [(self.root, np.arange(len(points)))]
+
+        while stack:
+            node, positions = stack.pop()
+            if node is None or len(positions) == 0:
+                continue
+
+            values = points[positions]
+            below = values < node['center']
+            above = values > node['center']
+
+            # Left of centre: matches are the node intervals starting at or before the point
+            counts = np.searchsorted(node['sorted_starts'], values[below], side='right')
+            self._emit(positions[below], counts, node['by_start'], point_ids, interval_ids, from_end=False)
+
+            # Right of centre: matches are the node intervals ending at or after the point
+            counts = len(node['sorted_ends']) - np.searchsorted(node['sorted_ends'], values[above], side='left')
+            self._emit(positions[above], counts, node['by_end'], point_ids, interval_ids, from_end=True)
+
+            # Exactly on the centre: every node interval matches
+            on_center = positions[~below & ~above]
+            counts = np.full(len(on_center), len(node['by_start']))
+            self._emit(on_center, counts, node['by_start'], point_ids, interval_ids, from_end=False)
+
+            stack.append((node['left'], positions[below]))
+            stack.append((node['right'], positions[above]))
+
+        if not point_ids:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+        return np.concatenate(point_ids), np.concatenate(interval_ids)
+
+    @staticmethod
+    def _emit(positions, counts, ordered_ids, point_ids, interval_ids, from_end):
+        """Expand per-point match counts into (point, interval) pairs."""
+        total = int(counts.sum())
+        if total == 0:
+            return
+
+        # Offset of each pair within its point's run of matches
+        run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+        offsets = np.arange(total) - run_starts
+        if from_end:
+            offsets = len(ordered_ids) - 1 - offsets
+
+        point_ids.append(np.repeat(positions, counts))
+        interval_ids.append(ordered_ids[offsets])
+
+    def overlap(self, start, end):
+        """Return the ids of intervals overlapping [start, end]."""
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if end < node['center']:
+                count = np.searchsorted(node['sorted_starts'], end, side='right')
+                matches.append(node['by_start'][:count])
+                stack.append(node['left'])
+            elif start > node['center']:
+                count = np.searchsorted(node['sorted_ends'], start, side='left')
+                matches.append(node['by_end'][count:])
+                stack.append(node['right'])
+            else:
+                matches.append(node['by_start'])
+                stack.append(node['left'])
+                stack.append(node['right'])
+
+        return np.sort(np.concatenate(matches)) if matches else np.array([], dtype=np.int64)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def _to_mercator(lat, lon):
+    """Convert latitude/longitude degrees to unit web-mercator coordinates."""
+    lat = np.clip(np.asarray(lat, dtype=float), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lon = np.asarray(lon, dtype=float)
+    mx = (lon + 180.0) / 360.0
+    my = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / np.pi) / 2.0
+    return mx, my
+
+
+def _from_mercator(mx, my):
+    """Convert unit web-mercator coordinates back to latitude/longitude degrees."""
+    lon = mx * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * my))))
+    return lat, lon
+
+
+def viewport_bounds(lat, lon, zoom, width=1024, height=768, tile_size=512):
+    """Return the (south, west, north, east) bounds of a map view in degrees.
+
+    The view is ``width`` x ``height`` pixels centred on (lat, lon); at zoom z
+    the whole world spans ``tile_size * 2**z`` pixels, as in Mapbox GL.
+    """
+    mx, my = _to_mercator(lat, lon)
+    world = tile_size * 2.0 ** zoom
+    half_x, half_y = width / 2 / world, height / 2 / world
+    north, west = _from_mercator(np.clip(mx - half_x, 0, 1), np.clip(my - half_y, 0, 1))
+    south, east = _from_mercator(np.clip(mx + half_x, 0, 1), np.clip(my + half_y, 0, 1))
+    return float(south), float(west), float(north), float(east)
+
+
+class TilePyramid:
+    def __init__(self, lat, lon, weights=None, min_zoom=8, max_zoom=16, bin_bits=6):
+        """Pre-aggregate points into per-zoom density cells.
+
+        Each zoom level splits every map tile into 2**bin_bits cells per side.
+        Only the finest level touches the raw points; every coarser level is
+        built from the one below by halving cell coordinates, so the pyramid
+        costs one pass over the points plus a pass over occupied cells per zoom.
+        """
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.bin_bits = bin_bits
+        self.levels = {}
+
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        weights = np.ones(len(lat)) if weights is None else np.asarray(weights, dtype=float)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+
+        scale = 2 ** (max_zoom + bin_bits)
+        mx, my = _to_mercator(lat[valid], lon[valid])
+        cell_x = np.clip((mx * scale).astype(np.int64), 0, scale - 1)
+        cell_y = np.clip((my * scale).astype(np.int64), 0, scale - 1)
+        counts = np.ones(len(cell_x), dtype=np.int64)
+        totals = weights[valid]
+
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            cell_x, cell_y, counts, totals = self._aggregate(cell_x, cell_y, counts, totals)
+            self.levels[zoom] = (cell_x, cell_y, counts, totals)
+            cell_x, cell_y = cell_x >> 1, cell_y >> 1
+
+    @staticmethod
+    def _aggregate(cell_x, cell_y, counts, totals):
+        """Sum counts and weights of points sharing a cell."""
+        keys = (cell_x << 32) | cell_y
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        return (
+            unique_keys >> 32,
+            unique_keys & 0xFFFFFFFF,
+            np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64),
+            np.bincount(inverse, weights=totals, minlength=len(unique_keys)),
+        )
+
+    def cells(self, zoom, bounds=None):
+        """Return aggregated cells for a zoom level, optionally clipped to a viewport.
+
+        ``bounds`` is (south, west, north, east) in degrees.
+        """
+        zoom = int(min(max(zoom, self.min_zoom), self.max_zoom))
+        cell_x, cell_y, counts, totals = self.levels[zoom]
+        scale = 2 ** (zoom + self.bin_bits)
+
+        if bounds is not None:
+            south, west, north, east = bounds
+            (left, right), (top, bottom) = _to_mercator([north, south], [west, east])
+            mask = (
+                (cell_x >= int(left * scale)) & (cell_x <= int(right * scale)) &
+                (cell_y >= int(top * scale)) & (cell_y <= int(bottom * scale))
+            )
+            cell_x, cell_y, counts, totals = cell_x[mask], cell_y[mask], counts[mask], totals[mask]
+
+        lat, lon = _from_mercator((cell_x + 0.5) / scale, (cell_y + 0.5) / scale)
+        return pd.DataFrame({
+            'Latitude': lat,
+            'Longitude': lon,
+            'Trips': counts,
+            'Total Passengers': totals.astype(np.int64)
+        })
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+
+class QueryService:
+    def __init__(self, rag_system, max_batch_size=32, max_wait_ms=5.0):
+        """Micro-batching asyncio front end for ``FetiiRAGSystem.search``.
+
+        Concurrent ``search`` calls are collected for up to ``max_wait_ms`` (or
+        until ``max_batch_size`` are waiting), then encoded and searched as one
+        batch on a worker thread while the event loop keeps accepting queries.
+        Each caller gets its own results through a future.
+        """
+        self.rag_system = rag_system
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.queries = 0
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+    async def start(self):
+        """Start the batching worker on the running event loop, if not started yet."""
+        if self._worker is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the worker; queries still queued or in the current batch are cancelled."""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            self._queue.get_nowait()[-1].cancel()
+        self._worker = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def search(self, query, top_k=5, filters=None):
+        """Queue one query and wait for its results."""
+        await self.start()
+        future = self._loop.create_future()
+        await self._queue.put((query, top_k, filters, future))
+        return await future
+
+    def run_in_background(self):
+        """Run the service on its own event loop in a daemon thread, for synchronous callers."""
+        started = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return self
+
+    def submit(self, query, top_k=5, filters=None):
+        """Queue a query from another thread; returns a ``concurrent.futures.Future``."""
+        return asyncio.run_coroutine_threadsafe(self.search(query, top_k, filters), self._loop)
+
+    async def _collect(self, batch):
+        """Wait for one query, then gather more into ``batch`` until it is full or the wait is over."""
+        batch.append(await self._queue.get())
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    def _search_batch(self, batch):
+        """Search a batch, one ``search_batch`` call per distinct ``top_k``."""
+        results = [None] * len(batch)
+        for top_k in {item[1] for item in batch}:
+            positions = [i for i, item in enumerate(batch) if item[1] == top_k]
+            found = self.rag_system.search_batch(
+                [batch[i][0] for i in positions], top_k, [batch[i][2] for i in positions]
+            )
+            for i, result in zip(positions, found):
+                results[i] = result
+        return results
+
+    async def _run(self):
+        # The batch being gathered or searched, so stop() can cancel its callers
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                # Callers that gave up while the batch was gathering are dropped
+                batch = [item for item in batch if not item[-1].done()]
+                if not batch:
+                    continue
+                self.batches += 1
+                self.queries += len(batch)
+
+                try:
+                    results = await self._loop.run_in_executor(None, self._search_batch, batch)
+                except Exception as e:
+                    for *_, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                for (*_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        except asyncio.CancelledError:
+            for *_, future in batch:
+                future.cancel()
+            raise
@@ -1,33 +1,128 @@
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
-import pickle
+import json
 import os
+import shutil
 from typing import List, Dict, Any
 import re
+import threading
+from trip_schema import UserHistoryIndex
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from vector_index import build_index, set_search_params, search_parameters, recall_at_k, flat_vectors, rescore, QuantizedVectors, IndexVectors
+from text_index import BM25Index, reciprocal_rank_fusion
+from encoders import create_encoder, encoder_id, cosine_agreement, HashingEncoder
 
 class FetiiRAGSystem:
-    def __init__(self, excel_file_path: str):
-        """Initialize the RAG system with Fetii data."""
+    # Exact-scan indexes that store vectors at the same precision as the quantized storage
+    QUANTIZED_FLAT_INDEXES = {'float16': 'fp16', 'int8': 'sq8'}
+    
+    def __init__(self, excel_file_path: str, model_name: str = 'all-MiniLM-L6-v2',
+                 embedding_cache_dir: str = 'embedding_cache', index_type: str = 'flat',
+                 index_params: Dict[str, Any] = None, vector_storage: str = 'float32',
+                 rescore_factor: int = 0, hybrid_search: bool = True,
+                 query_cache_size: int = 1024, query_cache_path: str = None,
+                 warm_up: bool = False, encoder_backend: str = 'torch',
+                 encoder_threads: int = None, onnx_dir: str = 'onnx_models',
+                 encoder_params: Dict[str, Any] = None):
+        """Initialize the RAG system with Fetii data.
+        
+        Chunk embeddings are cached on disk under ``embedding_cache_dir`` so
+        rebuilds only encode new or changed chunks; pass None to disable.
+        ``index_type`` picks the vector index ('flat', 'hnsw', 'ivf' or 'ivfpq',
+        see ``vector_index.build_index``) and ``index_params`` overrides its defaults.
+        ``vector_storage`` keeps embeddings as 'float32', 'float16' or 'int8'; a
+        'flat' index is then swapped for the matching 'fp16' or 'sq8' scan so no
+        float32 copy is kept alongside the codes. With a ``rescore_factor`` above zero, search fetches that many times ``top_k``
+        candidates and re-ranks them against the stored vectors. ``hybrid_search``
+        fuses the vector results with a BM25 keyword index over the chunk texts.
+        Query embeddings are kept in an LRU cache of ``query_cache_size`` entries,
+        persisted to ``query_cache_path`` when given.
+        
+        The embedding model is only loaded when something first needs to encode;
+        ``warm_up`` starts loading it in a background thread right away.
+        ``encoder_backend`` runs it on 'torch', or on onnxruntime as an 'onnx' or
+        dynamically quantized 'onnx-int8' export kept under ``onnx_dir`` (see
+        ``encoders.create_encoder``), using ``encoder_threads`` CPU threads.
+        The 'hashing' backend needs no model download: a hashed TF-IDF encoder
+        (``encoder_params`` such as ``n_features`` and ``svd_components``) fitted
+        on the chunks whenever embeddings are created.
+        """
         self.excel_file_path = excel_file_path
-        self.model = None
+        self.model_name = model_name
+        if index_type == 'flat' and vector_storage in self.QUANTIZED_FLAT_INDEXES:
+            index_type = self.QUANTIZED_FLAT_INDEXES[vector_storage]
+            print(f"Using a {index_type} index to match {vector_storage} vector storage")
+        self.index_type = index_type
+        self.index_params = index_params
+        self.vector_storage = vector_storage
+        self.rescore_factor = rescore_factor
+        self.hybrid_search = hybrid_search
+        self.encoder_backend = encoder_backend
+        self.encoder_threads = encoder_threads
+        self.onnx_dir = onnx_dir
+        self.encoder_params = encoder_params
+        self.encoder_id = encoder_id(model_name, encoder_backend)
+        
+        # Hashed TF-IDF vectors change whenever the encoder is refitted, and are
+        # cheaper to recompute than to look up, so they are never cached on disk
+        if encoder_backend == 'hashing':
+            embedding_cache_dir, query_cache_path = None, None
+        self.embedding_cache = EmbeddingCache(embedding_cache_dir, self.encoder_id) if embedding_cache_dir else None
+        self.query_cache = QueryEmbeddingCache(self.encoder_id, query_cache_size, query_cache_path)
+        self._model = None
+        self._model_loaded = False
+        self._model_lock = threading.Lock()
         self.index = None
+        self.text_index = None
         self.data_chunks = []
+        self.summary_chunks = None
+        self.summary_text_index = None
+        self.summary_embeddings = None
+        self.summary_index = None
         self.embeddings = None
         self.processed_data = None
+        self.user_history = None
         
-        # Load the embedding model
-        self._load_model()
+        # Warm the embedding model up without blocking start-up
+        if warm_up:
+            threading.Thread(target=self._load_model, daemon=True).start()
         
+    @property
+    def model(self):
+        """The embedding model, loaded on first use (None if it failed to load)."""
+        if not self._model_loaded:
+            self._load_model()
+        return self._model
+    
+    @model.setter
+    def model(self, model):
+        # Taking the lock means a warm-up load still in flight cannot overwrite this model
+        with self._model_lock:
+            self._model = model
+            self._model_loaded = True
+    
     def _load_model(self):
-        """Load the sentence transformer model."""
-        try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            print("✅ Loaded sentence transformer model")
-        except Exception as e:
-            print(f"❌ Error loading model: {e}")
-            self.model = None
+        """Load the embedding model, once, even when called from several threads."""
+        with self._model_lock:
+            if self._model_loaded:
+                return
+            try:
+                # Backends import their runtime lazily, so processes that never encode never import torch
+                self._model = create_encoder(self.model_name, self.encoder_backend, self.encoder_threads,
+                                             self.onnx_dir, self.encoder_params)
+                print(f"✅ Loaded {self.encoder_backend} embedding model")
+            except Exception as e:
+                print(f"❌ Error loading model: {e}")
+                self._model = None
+            self._model_loaded = True
+    
+    def _encode_texts(self, texts):
+        """Encode texts with the embedding model, loading it if needed."""
+        if self.model is None:
+            raise RuntimeError("Embedding model not loaded")
+        return self.model.encode(texts)
     
     def load_and_process_data(self):
         """Load and process the Fetii data for RAG."""
@@ -57,9 +152,23 @@ class FetiiRAGSystem:
         trip_data['Pick Up Category'] = trip_data['Pick Up Address Clean'].apply(self._categorize_location)
         trip_data['Drop Off Category'] = trip_data['Drop Off Address Clean'].apply(self._categorize_location)
         
-        # Merge with demographic data
+        # Merge with demographic data (trips are attributed to the booking user)
+        trip_data = trip_data.rename(columns={'Booking User ID': 'User ID'})
         self.processed_data = trip_data.merge(demo_data, on='User ID', how='left')
         
+        # Index each user's trips by time for rider-profile answers
+        self.user_history = UserHistoryIndex(
+            self.processed_data['User ID'].to_numpy(),
+            self.processed_data,
+            np.arange(len(self.processed_data)),
+            profile_columns={
+                'Top Pickup': 'Pick Up Address',
+                'Top Drop Off': 'Drop Off Address',
+                'Top Pickup Category': 'Pick Up Category',
+                'Top Drop Off Category': 'Drop Off Category'
+            }
+        )
+        
         print(f"✅ Processed {len(self.processed_data)} records")
         
     def _clean_address(self, address):
@@ -88,133 +197,462 @@ class FetiiRAGSystem:
         else:
             return "Other"
     
+    # Chunk metadata fields and the processed-data columns they come from
+    CHUNK_FIELDS = {
+        'trip_id': 'Trip ID',
+        'user_id': 'User ID',
+        'age': 'Age',
+        'age_group': 'Age Group',
+        'pickup_address': 'Pick Up Address',
+        'dropoff_address': 'Drop Off Address',
+        'pickup_category': 'Pick Up Category',
+        'dropoff_category': 'Drop Off Category',
+        'total_passengers': 'Total Passengers',
+        'trip_date': 'Trip Date and Time',
+        'day_of_week': 'DayOfWeek',
+        'hour': 'Hour',
+        'month': 'Month',
+        'year': 'Year'
+    }
+    
+    # Chunk text template: (label, column, skipped when the value is missing)
+    CHUNK_TEMPLATE = [
+        ('Trip ID', 'Trip ID', False),
+        ('User ID', 'User ID', False),
+        ('Total Passengers', 'Total Passengers', False),
+        ('Age', 'Age', True),
+        ('Age Group', 'Age Group', True),
+        ('Pickup', 'Pick Up Address', False),
+        ('Dropoff', 'Drop Off Address', False),
+        ('Pickup Category', 'Pick Up Category', False),
+        ('Dropoff Category', 'Drop Off Category', False),
+        ('Date', 'Trip Date and Time', True),
+        ('Day', 'DayOfWeek', True),
+        ('Hour', 'Hour', True),
+        ('Month', 'Month', True),
+        ('Year', 'Year', True)
+    ]
+    
     def create_data_chunks(self):
-        """Create searchable chunks from the processed data."""
+        """Create searchable chunks from the processed data.
+        
+        Chunk texts are built column by column and stored, together with the
+        chunk metadata, in a compact ChunkStore aligned with ``processed_data``.
+        Summary documents with exact aggregate stats go to a separate store.
+        """
         print("Creating data chunks for RAG...")
         
-        self.data_chunks = []
+        texts = self._create_chunk_texts(self.processed_data)
+        self.data_chunks = ChunkStore.from_frame(self.processed_data, self.CHUNK_FIELDS, texts)
         
-        # Create chunks for each trip record
-        for idx, row in self.processed_data.iterrows():
-            # Create a comprehensive text representation of each record
-            chunk_text = self._create_chunk_text(row)
+        # Keyword index for exact tokens (IDs, venue names) the embeddings blur
+        self.text_index = BM25Index(texts)
+        
+        summary_texts, summary_columns = self._create_summary_chunks(self.processed_data)
+        self.summary_chunks = ChunkStore(summary_texts, summary_columns)
+        self.summary_text_index = BM25Index(summary_texts)
+        
+        print(f"✅ Created {len(self.data_chunks)} data chunks and {len(self.summary_chunks)} summary chunks")
+    
+    def _create_chunk_texts(self, data):
+        """Create a comprehensive text representation of every data row at once."""
+        texts = None
+        for label, column, optional in self.CHUNK_TEMPLATE:
+            if column not in data.columns:
+                if optional:
+                    continue
+                part = pd.Series(f"{label}: N/A", index=data.index)
+            else:
+                values = data[column]
+                part = f"{label}: " + values.astype(str)
+                if optional:
+                    part = part.where(values.notna())
             
-            chunk = {
-                'id': idx,
-                'text': chunk_text,
-                'trip_id': row.get('Trip ID', ''),
-                'user_id': row.get('User ID', ''),
-                'age': row.get('Age', ''),
-                'age_group': row.get('Age Group', ''),
-                'pickup_address': row.get('Pick Up Address', ''),
-                'dropoff_address': row.get('Drop Off Address', ''),
-                'pickup_category': row.get('Pick Up Category', ''),
-                'dropoff_category': row.get('Drop Off Category', ''),
-                'total_passengers': row.get('Total Passengers', ''),
-                'trip_date': row.get('Trip Date and Time', ''),
-                'day_of_week': row.get('DayOfWeek', ''),
-                'hour': row.get('Hour', ''),
-                'month': row.get('Month', ''),
-                'year': row.get('Year', ''),
-                'raw_data': row.to_dict()
-            }
+            if texts is None:
+                texts = part
+            elif optional:
+                texts = texts + (" | " + part).fillna("")
+            else:
+                texts = texts + " | " + part
+        
+        return texts.to_numpy()
+    
+    # Hour bands that get their own summary, as (first hour, last hour)
+    HOUR_BANDS = {'late night': (0, 5), 'morning': (6, 11), 'afternoon': (12, 17), 'night': (18, 23)}
+    
+    # Venues need at least this many trips to get their own summary; a user
+    # with a single trip is already summarized by that trip's chunk
+    MIN_VENUE_TRIPS = 3
+    MIN_USER_TRIPS = 2
+    
+    # Summary kinds: (grouping column, label format); summaries of the same
+    # dimension compete with each other when a question is matched to one
+    SUMMARY_KINDS = {
+        'user': ('User ID', 'trips booked by User ID {}'),
+        'dropoff_venue': ('Drop Off Venue', 'trips to {}'),
+        'pickup_venue': ('Pick Up Venue', 'trips from {}'),
+        'dropoff_category': ('Drop Off Category', 'trips to the {} area'),
+        'pickup_category': ('Pick Up Category', 'trips from the {} area'),
+        'day': ('DayOfWeek', 'trips on {}s'),
+        'date': ('Trip Day', 'trips on {}'),
+        'hour_band': ('Hour Band', '{} trips'),
+        'overall': ('Dataset', 'all {} trips')
+    }
+    SUMMARY_DIMENSIONS = {
+        'user': 'user', 'dropoff_venue': 'place', 'pickup_venue': 'place', 'dropoff_category': 'place',
+        'pickup_category': 'place', 'day': 'day', 'date': 'day', 'hour_band': 'time', 'overall': 'overall'
+    }
+    
+    # Words asking about the dataset as a whole, answered from the overall summary
+    OVERALL_KEYWORDS = ['total', 'overall', 'all trips', 'busiest', 'dataset', 'altogether', 'in all']
+    
+    # Place names too broad to single out a venue, e.g. "riders from Austin"
+    CITY_NAMES = {'austin', 'texas', 'tx', 'usa', 'united states'}
+    
+    def _create_summary_chunks(self, data):
+        """Create one summary document per user, venue, location category, day and hour band.
+        
+        Each summary carries exact aggregate stats over all of its trips, so an
+        aggregate question is answered from one document instead of by counting
+        trip chunks. Returns (texts, columns) for a ChunkStore.
+        """
+        # Venue names are the first part of an address, in their most common spelling
+        venues = {}
+        for column in ('Pick Up Address', 'Drop Off Address'):
+            names = data[column].fillna('Unknown').astype(str).str.split(',').str[0].str.strip()
+            spellings = pd.DataFrame({'key': names.str.lower(), 'name': names}).value_counts().reset_index()
+            spellings = spellings.drop_duplicates('key').set_index('key')['name']
+            venues[column.replace('Address', 'Venue')] = names.str.lower().map(spellings)
+        hour_band = pd.Series(np.nan, index=data.index, dtype=object)
+        for band, (start, end) in self.HOUR_BANDS.items():
+            hour_band[data['Hour'].between(start, end)] = band
+        data = data.assign(**venues, **{
+            'Trip Day': data['Trip Date and Time'].dt.strftime('%Y-%m-%d'),
+            'Hour Band': hour_band,
+            'Dataset': 'Fetii'
+        })
+        
+        texts, columns = [], {field: [] for field in ('kind', 'key', 'trips', 'passengers', 'avg_group_size', 'avg_age',
+                                                          'top_pickup', 'top_dropoff', 'busiest_day', 'peak_hour',
+                                                          'first_trip', 'last_trip')}
+        for kind, (column, label) in self.SUMMARY_KINDS.items():
+            stats = self._summary_stats(data, column)
+            if kind == 'user':
+                stats = stats[stats['trips'] >= self.MIN_USER_TRIPS]
+            elif kind.endswith('_venue'):
+                stats = stats[stats['trips'] >= self.MIN_VENUE_TRIPS]
+            elif kind.endswith('_category'):
+                stats = stats.drop(['Other', 'Unknown'], errors='ignore')
             
-            self.data_chunks.append(chunk)
-        
-        print(f"✅ Created {len(self.data_chunks)} data chunks")
-    
-    def _create_chunk_text(self, row):
-        """Create a comprehensive text representation of a data row."""
-        text_parts = []
-        
-        # Basic trip info
-        text_parts.append(f"Trip ID: {row.get('Trip ID', 'N/A')}")
-        text_parts.append(f"User ID: {row.get('User ID', 'N/A')}")
-        text_parts.append(f"Total Passengers: {row.get('Total Passengers', 'N/A')}")
-        
-        # Demographics
-        if pd.notna(row.get('Age')):
-            text_parts.append(f"Age: {row.get('Age')}")
-        if pd.notna(row.get('Age Group')):
-            text_parts.append(f"Age Group: {row.get('Age Group')}")
-        
-        # Location info
-        text_parts.append(f"Pickup: {row.get('Pick Up Address', 'N/A')}")
-        text_parts.append(f"Dropoff: {row.get('Drop Off Address', 'N/A')}")
-        text_parts.append(f"Pickup Category: {row.get('Pick Up Category', 'N/A')}")
-        text_parts.append(f"Dropoff Category: {row.get('Drop Off Category', 'N/A')}")
-        
-        # Time info
-        if pd.notna(row.get('Trip Date and Time')):
-            text_parts.append(f"Date: {row.get('Trip Date and Time')}")
-        if pd.notna(row.get('DayOfWeek')):
-            text_parts.append(f"Day: {row.get('DayOfWeek')}")
-        if pd.notna(row.get('Hour')):
-            text_parts.append(f"Hour: {row.get('Hour')}")
-        if pd.notna(row.get('Month')):
-            text_parts.append(f"Month: {row.get('Month')}")
-        if pd.notna(row.get('Year')):
-            text_parts.append(f"Year: {row.get('Year')}")
-        
-        return " | ".join(text_parts)
+            for value, row in zip(stats.index, stats.to_dict('records')):
+                key = f"user {value}" if kind == 'user' else str(value).lower()
+                text = (f"Summary of {label.format(value)} | Trips: {row['trips']} | Total Passengers: {row['passengers']}"
+                        f" | Average Group Size: {row['avg_group_size']:.1f}")
+                if pd.notna(row['avg_age']):
+                    text += f" | Average Age: {row['avg_age']:.1f}"
+                text += (f" | Top Pickup: {row['top_pickup']} | Top Dropoff: {row['top_dropoff']}"
+                         f" | Busiest Day: {row['busiest_day']} | Peak Hour: {row['peak_hour']}:00"
+                         f" | Date Range: {row['first_trip']:%Y-%m-%d} to {row['last_trip']:%Y-%m-%d}")
+                texts.append(text)
+                columns['kind'].append(kind)
+                columns['key'].append(key)
+                for field in list(columns)[2:]:
+                    columns[field].append(row[field])
+        
+        columns['first_trip'] = pd.to_datetime(pd.Series(columns['first_trip'], dtype=object))
+        columns['last_trip'] = pd.to_datetime(pd.Series(columns['last_trip'], dtype=object))
+        return texts, columns
+    
+    def _summary_stats(self, data, column):
+        """Exact aggregate stats of the trips grouped by one column."""
+        grouped = data.groupby(column, sort=True)
+        stats = pd.DataFrame({
+            'trips': grouped.size(),
+            'passengers': grouped['Total Passengers'].sum(),
+            'first_trip': grouped['Trip Date and Time'].min(),
+            'last_trip': grouped['Trip Date and Time'].max()
+        })
+        stats['avg_group_size'] = stats['passengers'] / stats['trips']
+        stats['avg_age'] = grouped['Age'].mean() if 'Age' in data.columns else np.nan
+        
+        # Most common value of each column within a group, ties to the smallest
+        for field, source in (('top_pickup', 'Pick Up Venue'), ('top_dropoff', 'Drop Off Venue'),
+                              ('busiest_day', 'DayOfWeek'), ('peak_hour', 'Hour')):
+            if source == column:
+                stats[field] = stats.index
+                continue
+            counts = data.groupby([column, source]).size().rename('count').reset_index()
+            counts = counts.sort_values([column, 'count', source], ascending=[True, False, True])
+            stats[field] = counts.drop_duplicates(column).set_index(column)[source]
+        return stats
     
     def create_embeddings(self):
         """Create embeddings for all data chunks."""
-        if not self.model:
+        print("Creating embeddings...")
+        
+        # Extract text from chunks; summaries are encoded in the same batch
+        texts = self.data_chunks.texts()
+        summary_texts = self.summary_chunks.texts() if self.summary_chunks is not None else []
+        
+        # Create embeddings, reusing cached vectors for unchanged chunks; a fully
+        # cached rebuild never loads the model
+        try:
+            if self.encoder_backend == 'hashing':
+                self.model.fit(texts + summary_texts)
+                self.query_cache.entries.clear()
+            if self.embedding_cache is not None:
+                embeddings = self.embedding_cache.encode(texts + summary_texts, self._encode_texts)
+            else:
+                embeddings = self._encode_texts(texts + summary_texts)
+        except RuntimeError:
             print("❌ Model not loaded")
             return
         
-        print("Creating embeddings...")
+        # Normalize embeddings so inner product is cosine similarity
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        self.embeddings = np.ascontiguousarray(embeddings[:len(texts)])
         
-        # Extract text from chunks
-        texts = [chunk['text'] for chunk in self.data_chunks]
-        
-        # Create embeddings
-        self.embeddings = self.model.encode(texts)
+        # Summaries get their own small exact index
+        if summary_texts:
+            self.summary_embeddings = np.ascontiguousarray(embeddings[len(texts):])
+            self.summary_index, _ = build_index(self.summary_embeddings, 'flat')
         
         # Create FAISS index
-        dimension = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+        self.index, self.index_params = build_index(self.embeddings, self.index_type, self.index_params)
+        
+        # Keep a single copy of the vectors: share the flat index's storage, quantize,
+        # or read rows back from the index. PQ codes only approximate the vectors,
+        # so exact float32 rows are kept for PQ indexes that rescore with them.
+        if self.vector_storage != 'float32':
+            self.embeddings = QuantizedVectors.from_float(self.embeddings, self.vector_storage)
+        elif self.index_type == 'flat':
+            self.embeddings = flat_vectors(self.index)
+        elif self.index_type not in ('pq', 'ivfpq') or not self.rescore_factor:
+            self.embeddings = IndexVectors(self.index)
+        
+        print(f"✅ Created embeddings and {self.index_type} FAISS index with {self.index.ntotal} vectors")
+    
+    def set_search_params(self, **params):
+        """Tune query-time index parameters such as ``nprobe`` or ``ef_search``."""
+        self.index_params = {**self.index_params, **params}
+        set_search_params(self.index, self.index_type, self.index_params)
+    
+    def measure_recall(self, top_k: int = 10, n_queries: int = 200, seed: int = 0) -> float:
+        """Measure recall@k of the index against exact search, using stored vectors as queries."""
+        rows = np.random.default_rng(seed).choice(len(self.embeddings), min(n_queries, len(self.embeddings)), replace=False)
+        return recall_at_k(self.index, self.embeddings, self.embeddings[np.sort(rows)], top_k)
+    
+    def check_encoder_agreement(self, n_texts: int = 200, seed: int = 0) -> Dict[str, float]:
+        """Compare the configured encoder with the PyTorch model on sampled chunk texts.
         
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(self.embeddings)
-        self.index.add(self.embeddings)
+        Returns the mean and minimum cosine between the two embeddings of each text.
+        """
+        rows = np.random.default_rng(seed).choice(len(self.data_chunks), min(n_texts, len(self.data_chunks)), replace=False)
+        texts = [self.data_chunks.text(row) for row in np.sort(rows)]
+        reference = create_encoder(self.model_name, 'torch', self.encoder_threads)
+        return cosine_agreement(reference, self.model, texts)
+    
+    # Filtered searches over at most this many chunks are scored exactly
+    EXACT_FILTER_LIMIT = 10000
+    
+    def _filter_mask(self, filters):
+        """Resolve structured filters to a boolean mask over chunks.
         
-        print(f"✅ Created embeddings and FAISS index with {self.index.ntotal} vectors")
+        Supported keys: ``user_id``, ``trip_id`` (a value or list of values),
+        ``category`` (pickup or drop-off), ``pickup_category``, ``dropoff_category``,
+        ``day``, ``hours`` as (start, end) wrapping past midnight when start > end,
+        ``age`` as (low, high), and ``start_date`` / ``end_date`` (whole days when
+        no time is given).
+        """
+        store = self.data_chunks
+        mask = np.ones(len(store), dtype=bool)
+        for key, value in filters.items():
+            if value is None:
+                continue
+            if key in ('user_id', 'trip_id', 'pickup_category', 'dropoff_category'):
+                mask &= store.equals(key, value)
+            elif key == 'category':
+                mask &= store.equals('pickup_category', value) | store.equals('dropoff_category', value)
+            elif key == 'day':
+                days = [value] if isinstance(value, str) else value
+                mask &= store.equals('day_of_week', [day.title() for day in days])
+            elif key == 'hours':
+                start, end = value
+                if start <= end:
+                    mask &= store.between('hour', start, end)
+                else:
+                    mask &= store.between('hour', start, 23) | store.between('hour', 0, end)
+            elif key == 'age':
+                mask &= store.between('age', *value)
+            elif key == 'start_date':
+                mask &= store.between('trip_date', low=pd.Timestamp(value))
+            elif key == 'end_date':
+                end = pd.Timestamp(value)
+                if end == end.normalize():
+                    end += pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+                mask &= store.between('trip_date', high=end)
+            else:
+                raise ValueError(f"Unknown search filter {key!r}")
+        return mask
     
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
-        """Search for relevant data chunks using semantic similarity."""
-        if not self.model or not self.index:
+    def _encode_queries(self, queries):
+        """Encode queries into normalized float32 vectors with one encoder call."""
+        query_embeddings = np.ascontiguousarray(self._encode_texts(list(queries)), dtype=np.float32)
+        faiss.normalize_L2(query_embeddings)
+        return query_embeddings
+    
+    def _vector_search(self, query_embedding, top_k, allowed=None):
+        """Return (ids, cosine scores) of the nearest chunk vectors, optionally within a mask."""
+        parameters = None
+        if allowed is not None:
+            # Small subsets, and indexes without selector support, are scored exactly
+            parameters, bitmap = search_parameters(self.index_type, self.index_params, allowed)
+            if parameters is None or allowed.sum() <= self.EXACT_FILTER_LIMIT:
+                return rescore(self.embeddings, query_embedding, np.flatnonzero(allowed), top_k)
+        
+        # Optionally re-rank a wider candidate set against the stored vectors
+        if self.rescore_factor > 0 and self.embeddings is not None:
+            _, candidates = self.index.search(query_embedding, top_k * self.rescore_factor, params=parameters)
+            return rescore(self.embeddings, query_embedding, candidates[0], top_k)
+        
+        scores, indices = self.index.search(query_embedding, top_k, params=parameters)
+        found = indices[0] >= 0
+        return indices[0][found], scores[0][found]
+    
+    def search(self, query: str, top_k: int = 5, filters: Dict[str, Any] = None) -> List[Dict]:
+        """Search for relevant data chunks using semantic similarity.
+        
+        With hybrid search, the vector and BM25 candidate lists are merged by
+        reciprocal-rank fusion, so exact ID or venue matches rank next to
+        semantically close chunks. Scores reported are always cosine similarity.
+        ``filters`` (see ``_filter_mask``) restrict both searches to matching chunks.
+        """
+        return self.search_batch([query], top_k, [filters])[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = 5, filters: List[Dict[str, Any]] = None) -> List[List[Dict]]:
+        """Run ``search`` for several queries at once.
+        
+        All queries are encoded in one encoder call, and the unfiltered ones
+        share a single index search. ``filters`` holds one filter dict (or None)
+        per query. Returns one result list per query.
+        """
+        if not self.index:
             print("❌ RAG system not initialized")
-            return []
+            return [[] for _ in queries]
+        
+        # Create query embeddings, reusing them for repeated questions
+        try:
+            query_embeddings = self.query_cache.get_many(queries, self._encode_queries)
+        except RuntimeError:
+            print("❌ Model not loaded")
+            return [[] for _ in queries]
+        
+        filters = filters or [None] * len(queries)
+        hybrid = self.hybrid_search and self.text_index is not None
+        n_candidates = max(top_k * 4, 20) if hybrid else top_k
+        
+        # Unfiltered queries go through the index together
+        vector_hits = {}
+        unfiltered = [i for i, query_filters in enumerate(filters) if not query_filters]
+        if unfiltered:
+            batch = query_embeddings[unfiltered]
+            if self.rescore_factor > 0 and self.embeddings is not None:
+                _, candidates = self.index.search(batch, n_candidates * self.rescore_factor)
+                for i, query_embedding, row in zip(unfiltered, batch, candidates):
+                    vector_hits[i] = rescore(self.embeddings, query_embedding, row, n_candidates)
+            else:
+                scores, indices = self.index.search(batch, n_candidates)
+                for i, row_scores, row in zip(unfiltered, scores, indices):
+                    vector_hits[i] = (row[row >= 0], row_scores[row >= 0])
         
-        # Create query embedding
-        query_embedding = self.model.encode([query])
-        faiss.normalize_L2(query_embedding)
+        return [
+            self._rank(query, query_embeddings[i:i + 1], top_k, filters[i], vector_hits.get(i))
+            for i, query in enumerate(queries)
+        ]
+    
+    def _rank(self, query, query_embedding, top_k, filters, vector_hits=None):
+        """Rank chunks for one encoded query, given its vector hits if already searched."""
+        allowed = self._filter_mask(filters) if filters else None
+        if allowed is not None and not allowed.any():
+            return []
         
-        # Search
-        scores, indices = self.index.search(query_embedding, top_k)
+        if self.hybrid_search and self.text_index is not None:
+            n_candidates = max(top_k * 4, 20)
+            vector_ids, _ = vector_hits if vector_hits is not None else self._vector_search(query_embedding, n_candidates, allowed)
+            keyword_ids, _ = self.text_index.search(query, n_candidates, allowed)
+            indices, _ = reciprocal_rank_fusion([vector_ids, keyword_ids], top_k)
+            indices = np.asarray(indices, dtype=np.int64)
+            scores = np.asarray(self.embeddings[indices], dtype=np.float32) @ query_embedding[0] if len(indices) else []
+        else:
+            indices, scores = vector_hits if vector_hits is not None else self._vector_search(query_embedding, top_k, allowed)
         
         # Return results
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.data_chunks):
-                result = self.data_chunks[idx].copy()
-                result['similarity_score'] = float(score)
-                results.append(result)
+        for score, idx in zip(scores, indices):
+            if 0 <= idx < len(self.data_chunks):
+                results.append(self.data_chunks.view(idx, float(score)))
         
         return results
     
-    def answer_question(self, question: str, top_k: int = 5) -> Dict[str, Any]:
-        """Answer a question using RAG."""
-        # Search for relevant data
-        relevant_chunks = self.search(question, top_k)
+    def search_summaries(self, query: str, top_k: int = 5) -> List[Dict]:
+        """Search the summary documents, fusing vector and keyword hits like ``search``."""
+        if self.summary_index is None:
+            return []
+        try:
+            query_embedding = self.query_cache.get_many([query], self._encode_queries)
+        except RuntimeError:
+            print("❌ Model not loaded")
+            return []
+        
+        n_candidates = min(max(top_k * 4, 20), self.summary_index.ntotal)
+        _, vector_ids = self.summary_index.search(query_embedding, n_candidates)
+        keyword_ids, _ = self.summary_text_index.search(query, n_candidates)
+        indices, _ = reciprocal_rank_fusion([vector_ids[0][vector_ids[0] >= 0], keyword_ids], top_k)
+        scores = self.summary_embeddings[indices] @ query_embedding[0] if indices else []
+        return [self.summary_chunks.view(idx, float(score)) for idx, score in zip(indices, scores)]
+    
+    # Words that mark a question as asking for an aggregate rather than for trips
+    AGGREGATE_KEYWORDS = ['how many', 'number of', 'total', 'average', 'busiest', 'most', 'popular',
+                          'summary', 'summarize', 'overall', 'statistics', 'stats', 'count']
+    
+    def answer_question(self, question: str, top_k: int = 5, filters: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Answer a question using RAG.
+        
+        Fully structured questions (trip or user IDs, location counts, top spots
+        for an age/day/time slice) are answered exactly from the chunk columns
+        without encoding the question. Other aggregate questions are answered
+        from a matching summary document when there is one, then by counting
+        the trips in the slice they name; everything else goes through retrieval
+        over the trip chunks. ``filters`` restrict every route, and any route
+        that cannot honour a constraint in them or in the question passes.
+        """
+        structured = self._structured_answer(question, top_k, filters)
+        if structured is not None:
+            return structured
+        
+        if filters is None:
+            summary = self._summary_answer(question)
+            if summary is not None:
+                return summary
+        
+        # Counts over an age / day / time / date slice that no summary covers
+        count = self._count_answer(question, top_k, filters)
+        if count is not None:
+            return count
+        
+        # Search for relevant data, restricted to any user/trip/day the question names
+        if filters is None:
+            filters = self._extract_filters(question)
+        relevant_chunks = self.search(question, top_k, filters)
         
         if not relevant_chunks:
+            matching = ", ".join(f"{key.replace('_', ' ')} {value}" for key, value in filters.items())
             return {
-                'answer': "I couldn't find relevant information to answer your question.",
+                'answer': f"I couldn't find any records with {matching}." if filters else "I couldn't find relevant information to answer your question.",
                 'sources': [],
-                'confidence': 0.0
+                'confidence': 0.0,
+                'route': 'semantic'
             }
         
         # Extract specific information based on question type
@@ -223,7 +661,280 @@ class FetiiRAGSystem:
         return {
             'answer': answer,
             'sources': relevant_chunks,
-            'confidence': relevant_chunks[0]['similarity_score'] if relevant_chunks else 0.0
+            'confidence': relevant_chunks[0]['similarity_score'] if relevant_chunks else 0.0,
+            'route': 'semantic'
+        }
+    
+    def _structured_answer(self, question: str, top_k: int = 5, filters: Dict[str, Any] = None):
+        """Answer a structured question from indexed columns, or return None to fall back."""
+        store = self.data_chunks
+        if not len(store):
+            return None
+        
+        question_lower = question.lower()
+        filters = {**self._extract_filters(question), **(filters or {})}
+        
+        # Every constraint other than an ID narrows the rows a branch looks at
+        slice_filters = {key: value for key, value in filters.items() if key not in ('trip_id', 'user_id')}
+        
+        def result(answer, rows):
+            return {
+                'answer': answer,
+                'sources': [store.view(row, 1.0) for row in rows[:top_k]],
+                'confidence': 1.0 if len(rows) else 0.0,
+                'route': 'structured'
+            }
+        
+        def latest_first(rows):
+            return rows[np.argsort(-store.column('trip_date')[rows].astype(np.int64), kind='stable')]
+        
+        # Trip details by ID; an ID with further constraints is left to filtered search
+        if ('trip_id' in filters or 'user_id' in filters) and slice_filters:
+            return None
+        if 'trip_id' in filters:
+            trip_id = filters['trip_id']
+            rows = np.flatnonzero(store.equals('trip_id', trip_id))
+            if not len(rows):
+                return result(f"Sorry, I couldn't find Trip ID {trip_id} in the Fetii dataset.", rows)
+            trip = store.view(rows[0])
+            return result(f"""
+            **Trip ID {trip_id} Details:**
+            - Booked By: User ID {trip['user_id']}
+            - Total Passengers: {trip['total_passengers']}
+            - Date: {trip['trip_date']} ({trip['day_of_week']})
+            - Pickup: {trip['pickup_address']} ({trip['pickup_category']})
+            - Dropoff: {trip['dropoff_address']} ({trip['dropoff_category']})
+            """, rows)
+        
+        # User profile by ID, answered from the user's own records
+        if 'user_id' in filters:
+            user_id = filters['user_id']
+            rows = latest_first(np.flatnonzero(store.equals('user_id', user_id)))
+            if not len(rows):
+                return result(f"Sorry, I couldn't find any data for User ID {user_id} in the Fetii dataset.", rows)
+            return result(self._extract_answer(question, [store.view(row, 1.0) for row in rows]), rows)
+        
+        # Trip counts to (or, with pickup wording, from) a known location
+        location = self._extract_location(question)
+        side = self._trip_direction(question_lower)
+        if location != "specified location" and side is not None and \
+                any(keyword in question_lower for keyword in ['how many', 'went to', 'go to', 'trips to', 'groups to', 'trips from']):
+            direction = 'from' if side == 'pickup' else 'to'
+            mask = store.contains(f'{side}_address', location) | store.contains(f'{side}_category', location)
+            if slice_filters:
+                mask &= self._filter_mask(slice_filters)
+            rows = latest_first(np.flatnonzero(mask))
+            title = f"{direction} {location}" + (f", {self._describe_filters(slice_filters)}" if slice_filters else "")
+            if not len(rows):
+                return result(f"No trips found {title} in the dataset.", rows)
+            dates = store.column('trip_date')[rows]
+            return result(f"""
+            **Trips {title}:**
+            - Total trips found: {len(rows)}
+            - Average group size: {store.column('total_passengers')[rows].mean():.1f} passengers
+            - Date range: {pd.Timestamp(dates.min())} to {pd.Timestamp(dates.max())}
+            """, rows)
+        
+        # Top pickup or drop-off spots for an age / day / time slice
+        if any(keyword in question_lower for keyword in ['top', 'popular', 'most common']) and \
+                any(keyword in question_lower for keyword in ['drop-off', 'dropoff', 'drop off', 'pickup', 'pick-up', 'pick up', 'spots']):
+            field = 'pickup_address' if 'pick' in question_lower else 'dropoff_address'
+            rows = np.flatnonzero(self._filter_mask(slice_filters))
+            if not len(rows):
+                return result("No trips match those filters in the dataset.", rows)
+            spots = pd.Series(store.column(field)[rows]).value_counts().head(5)
+            kind = 'Pickup' if field == 'pickup_address' else 'Drop-off'
+            answer = f"**Top {kind} Spots** ({len(rows)} matching trips):\n"
+            for spot, count in spots.items():
+                answer += f"\n- {spot}: {count} trips"
+            return result(answer, rows)
+        
+        return None
+    
+    # Words that ask for a number of trips or riders
+    COUNT_KEYWORDS = ['how many', 'number of', 'count', 'total']
+    
+    def _count_answer(self, question: str, top_k: int = 5, filters: Dict[str, Any] = None):
+        """Count the trips in an age / day / time / date slice, or return None to fall back.
+        
+        Questions naming a location or an ID are left to the other routes, which
+        know how to honour them.
+        """
+        store = self.data_chunks
+        question_lower = question.lower()
+        if not len(store) or not any(keyword in question_lower for keyword in self.COUNT_KEYWORDS):
+            return None
+        filters = {**self._extract_filters(question), **(filters or {})}
+        if not filters or 'trip_id' in filters or 'user_id' in filters or \
+                self._extract_location(question) != "specified location":
+            return None
+        
+        rows = np.flatnonzero(self._filter_mask(filters))
+        description = self._describe_filters(filters)
+        if not len(rows):
+            answer = f"No trips found {description} in the dataset."
+        else:
+            dates = store.column('trip_date')[rows]
+            passengers = store.column('total_passengers')[rows]
+            answer = f"""
+            **Trips {description}:**
+            - Total trips found: {len(rows)}
+            - Distinct riders booking: {len(np.unique(store.column('user_id')[rows]))}
+            - Total passengers: {int(passengers.sum())}
+            - Average group size: {passengers.mean():.1f} passengers
+            - Date range: {pd.Timestamp(dates.min())} to {pd.Timestamp(dates.max())}
+            """
+        return {
+            'answer': answer,
+            'sources': [store.view(row, 1.0) for row in rows[:top_k]],
+            'confidence': 1.0 if len(rows) else 0.0,
+            'route': 'structured'
+        }
+    
+    def _describe_filters(self, filters: Dict[str, Any]) -> str:
+        """Phrase structured filters for an answer title, e.g. 'on Saturday, aged 31+'."""
+        parts = []
+        for key, value in filters.items():
+            if key == 'day':
+                days = [value] if isinstance(value, str) else value
+                parts.append("on " + " or ".join(day.title() for day in days))
+            elif key == 'hours':
+                parts.append(f"between {value[0]}:00 and {value[1]}:59")
+            elif key == 'age':
+                low, high = value
+                parts.append(f"booked by riders aged {low}+" if high >= 200 else
+                             f"booked by riders under {high + 1}" if low == 0 else
+                             f"booked by riders aged {low}-{high}")
+            elif key == 'start_date' and filters.get('end_date') == value:
+                parts.append(f"on {pd.Timestamp(value):%Y-%m-%d}")
+            elif key == 'start_date':
+                parts.append(f"since {pd.Timestamp(value):%Y-%m-%d}")
+            elif key == 'end_date':
+                if filters.get('start_date') != value:
+                    parts.append(f"until {pd.Timestamp(value):%Y-%m-%d}")
+            else:
+                parts.append(f"with {key.replace('_', ' ')} {value}")
+        return ", ".join(parts)
+    
+    # Wording that places a location at the start or the end of a trip
+    PICKUP_KEYWORDS = ['pick', 'from ', 'start', 'leave', 'leaving', 'left ', 'depart', 'origin']
+    DROPOFF_KEYWORDS = [' to ', 'drop', 'arriv', 'destination', 'headed', 'ending at', 'end at', 'end up']
+    
+    def _trip_direction(self, question_lower: str):
+        """Whether a question asks where trips start ('pickup') or end ('dropoff').
+        
+        Returns None when the wording names both or neither, so callers fall
+        back to retrieval instead of guessing a side.
+        """
+        pickup = any(keyword in question_lower for keyword in self.PICKUP_KEYWORDS)
+        dropoff = any(keyword in question_lower for keyword in self.DROPOFF_KEYWORDS)
+        if pickup == dropoff:
+            return None
+        return 'pickup' if pickup else 'dropoff'
+    
+    def _summary_answer(self, question: str):
+        """Answer an aggregate question from the one summary it names, or return None to fall back."""
+        question_lower = question.lower()
+        if not any(keyword in question_lower for keyword in self.AGGREGATE_KEYWORDS):
+            return None
+        
+        # Summaries cover a single user, place, day or time band over all dates,
+        # and no age slice
+        filters = self._extract_filters(question)
+        if {'age', 'start_date', 'end_date'} & set(filters):
+            return None
+        
+        if self.summary_index is None:
+            return None
+        
+        # Names are matched against the summary keys themselves, so a summary is
+        # found however far down the retrieval ranking it would land
+        store = self.summary_chunks
+        _, _, keys = store.columns['key']
+        named = {}
+        for key in keys:
+            if key not in question_lower:
+                continue
+            # Whole words (or their plural), so "night" does not match "nightclubs"
+            match = re.search(r'(?<!\w)' + re.escape(key) + r"(?:s|'s)?(?!\w)", question, re.IGNORECASE)
+            if match:
+                named[key] = match.group(0)
+        rows = np.flatnonzero(store.equals('key', list(named))) if named else []
+        
+        # One-word venue names double as common words ("Rain") or cities ("Austin"),
+        # so they only count when written like a name, and never for a city
+        def names_venue(row):
+            key = store.value('key', row)
+            if not store.value('kind', row).endswith('_venue') or ' ' in key:
+                return True
+            return key not in self.CITY_NAMES and not named[key].islower()
+        
+        rows = [row for row in rows if store.value('kind', row) != 'overall' and names_venue(row)]
+        
+        # Questions about the dataset as a whole get the overall summary
+        if not rows and not filters and self._extract_location(question) == "specified location" and \
+                any(keyword in question_lower for keyword in self.OVERALL_KEYWORDS):
+            rows = list(np.flatnonzero(store.equals('kind', 'overall')))
+        side = self._trip_direction(question_lower)
+        if side is not None:
+            rows = [row for row in rows if not store.value('kind', row).startswith('dropoff' if side == 'pickup' else 'pickup')]
+        elif len({store.value('kind', row).split('_')[0] for row in rows} & {'pickup', 'dropoff'}) > 1:
+            # A place named on both sides without saying which is left to retrieval
+            return None
+        if len({self.SUMMARY_DIMENSIONS[store.value('kind', row)] for row in rows}) != 1:
+            return None
+        
+        # Retrieval only ranks the named summaries
+        try:
+            query_embedding = self.query_cache.get_many([question], self._encode_queries)
+        except RuntimeError:
+            print("❌ Model not loaded")
+            return None
+        scores = self.summary_embeddings[rows] @ query_embedding[0]
+        
+        # The most specific name wins, e.g. "late night" over "night"
+        best = max(range(len(rows)), key=lambda i: (len(store.value('key', rows[i])), scores[i]))
+        summary = store.view(rows[best], float(scores[best]))
+        title, *stats = summary['text'].split(' | ')
+        answer = f"**{title}:**\n" + "\n".join(f"- {stat}" for stat in stats)
+        return {
+            'answer': answer,
+            'sources': [summary],
+            'confidence': summary['similarity_score'],
+            'route': 'summary'
+        }
+    
+    def _profile_from_chunks(self, chunks):
+        """Build a UserHistoryIndex-style profile from one user's chunks.
+        
+        Returns (profile, latest trip) with the same keys as ``user_history``,
+        or (None, None) when there are no chunks. Most frequent values break
+        ties towards the most recent trip, as the index does.
+        """
+        if not chunks:
+            return None, None
+        chunks = sorted(chunks, key=lambda chunk: chunk['trip_date'], reverse=True)
+        
+        def most_frequent(field):
+            values = [chunk[field] for chunk in chunks]
+            counts = pd.Series(values).value_counts(sort=False)
+            return max(counts.index, key=lambda value: (counts[value], -values.index(value)))
+        
+        latest = chunks[0]
+        profile = {
+            'Trip Count': len(chunks),
+            'First Seen': chunks[-1]['trip_date'],
+            'Latest Trip': latest['trip_date'],
+            'Latest Trip ID': latest['trip_id'],
+            'Top Pickup': most_frequent('pickup_address'),
+            'Top Drop Off': most_frequent('dropoff_address'),
+            'Top Pickup Category': most_frequent('pickup_category'),
+            'Top Drop Off Category': most_frequent('dropoff_category')
+        }
+        return profile, {
+            'Age': latest.get('age', 'Not available'),
+            'Pick Up Address': latest['pickup_address'],
+            'Drop Off Address': latest['dropoff_address']
         }
     
     def _extract_answer(self, question: str, chunks: List[Dict]) -> str:
@@ -234,22 +945,25 @@ class FetiiRAGSystem:
         if any(keyword in question_lower for keyword in ['age of user', 'user id', 'userid', 'user']):
             user_id = self._extract_user_id(question)
             if user_id:
-                user_chunks = [chunk for chunk in chunks if chunk.get('user_id') == user_id]
-                if user_chunks:
-                    chunk = user_chunks[0]
+                # A loaded system has no history index; the user's own chunks give the same profile
+                if self.user_history is not None:
+                    profile = self.user_history.profile(user_id)
+                    latest = self.user_history.history(user_id).iloc[0] if profile else None
+                else:
+                    profile, latest = self._profile_from_chunks([chunk for chunk in chunks if chunk.get('user_id') == user_id])
+                if profile:
                     return f"""
                     **User ID {user_id} Information:**
-                    - Age: {chunk.get('age', 'Not available')}
-                    - Age Group: {chunk.get('age_group', 'Not available')}
-                    - Total Passengers: {chunk.get('total_passengers', 'Not available')}
-                    - Most Recent Trip: {chunk.get('trip_date', 'Not available')}
-                    - Common Pickup: {chunk.get('pickup_category', 'Not available')}
-                    - Common Dropoff: {chunk.get('dropoff_category', 'Not available')}
-                    - Pickup Address: {chunk.get('pickup_address', 'Not available')}
-                    - Dropoff Address: {chunk.get('dropoff_address', 'Not available')}
+                    - Age: {latest.get('Age', 'Not available')}
+                    - Total Trips: {profile['Trip Count']}
+                    - First Seen: {profile['First Seen']}
+                    - Most Recent Trip: {profile['Latest Trip']} (Trip ID {profile['Latest Trip ID']})
+                    - Common Pickup: {profile['Top Pickup Category']} ({profile['Top Pickup']})
+                    - Common Dropoff: {profile['Top Drop Off Category']} ({profile['Top Drop Off']})
+                    - Most Recent Pickup Address: {latest.get('Pick Up Address', 'Not available')}
+                    - Most Recent Dropoff Address: {latest.get('Drop Off Address', 'Not available')}
                     """
-                else:
-                    return f"Sorry, I couldn't find any data for User ID {user_id} in the Fetii dataset."
+                return f"Sorry, I couldn't find any data for User ID {user_id} in the Fetii dataset."
         
         # Handle location queries
         elif any(keyword in question_lower for keyword in ['went to', 'go to', 'trips to', 'groups to', 'moody center']):
@@ -286,6 +1000,56 @@ class FetiiRAGSystem:
         # Default response
         return f"Based on the data, I found {len(chunks)} relevant records. Here are the key details from the most relevant match:\n\n{chunks[0]['text']}"
     
+    def _extract_filters(self, question: str) -> Dict[str, Any]:
+        """Extract structured search filters explicitly named in a question."""
+        question_lower = question.lower()
+        filters = {}
+        
+        user_match = re.search(r'user\s*(?:id\s*)?(\d+)', question_lower)
+        if user_match:
+            filters['user_id'] = int(user_match.group(1))
+        trip_match = re.search(r'trip\s*(?:id\s*)?(\d+)', question_lower)
+        if trip_match:
+            filters['trip_id'] = int(trip_match.group(1))
+        
+        days = [day for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'] if day in question_lower]
+        if days:
+            filters['day'] = days
+        
+        # Same time-of-day windows as the data processor; "late night" is
+        # checked first, as it also contains "night"
+        if 'late night' in question_lower:
+            filters['hours'] = self.HOUR_BANDS['late night']
+        elif re.search(r'\b(?:night|evening)s?\b', question_lower):
+            filters['hours'] = (18, 23)
+        elif re.search(r'\bmornings?\b', question_lower):
+            filters['hours'] = (6, 11)
+        elif re.search(r'\bafternoons?\b', question_lower):
+            filters['hours'] = (12, 17)
+        
+        age_match = re.search(r'(\d{2})\s*(?:-|to)\s*(\d{2})\s*(?:year|yr|yo)', question_lower)
+        under_match = re.search(r'under\s+(\d{2})', question_lower)
+        over_match = re.search(r'over\s+(\d{2})', question_lower)
+        if age_match:
+            filters['age'] = (int(age_match.group(1)), int(age_match.group(2)))
+        elif under_match:
+            filters['age'] = (0, int(under_match.group(1)) - 1)
+        elif over_match:
+            filters['age'] = (int(over_match.group(1)) + 1, 200)
+        
+        # Relative periods count back from the latest trip, as the data is a past export
+        days_match = re.search(r'(?:last|past)\s+(\d+)\s+days', question_lower)
+        period = int(days_match.group(1)) if days_match else \
+            30 if re.search(r'(?:last|past) month', question_lower) else \
+            7 if re.search(r'(?:last|past) week', question_lower) else None
+        if (period or 'yesterday' in question_lower) and len(self.data_chunks):
+            latest = pd.Timestamp(self.data_chunks.column('trip_date').max())
+            if period:
+                filters['start_date'] = latest - pd.Timedelta(days=period)
+            else:
+                filters['start_date'] = filters['end_date'] = latest.normalize() - pd.Timedelta(days=1)
+        return filters
+    
     def _extract_user_id(self, question: str) -> int:
         """Extract user ID from question."""
         patterns = [
@@ -313,38 +1077,114 @@ class FetiiRAGSystem:
         
         return "specified location"
     
-    def save_system(self, filepath: str):
-        """Save the RAG system to disk."""
-        system_data = {
-            'data_chunks': self.data_chunks,
-            'embeddings': self.embeddings
-        }
+    def save_system(self, directory: str):
+        """Save the RAG system to a directory.
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(system_data, f)
+        Embeddings go to a raw ``.npy`` file, the FAISS index through FAISS's own
+        serializer and the chunks to one file per column, so ``load_system`` can
+        memory-map everything instead of unpickling and re-indexing.
+        
+        Everything is written to a sibling staging directory that then replaces
+        ``directory``, so a reader never sees a mix of old and new files and
+        processes that still map the old files keep reading them unchanged.
+        """
+        target = directory.rstrip(os.sep)
+        directory = f"{target}.saving-{os.getpid()}"
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        if isinstance(self.embeddings, QuantizedVectors):
+            np.save(os.path.join(directory, 'embeddings.npy'), self.embeddings.codes)
+            if self.embeddings.scale is not None:
+                np.save(os.path.join(directory, 'embedding_scale.npy'), self.embeddings.scale)
+        else:
+            np.save(os.path.join(directory, 'embeddings.npy'), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        faiss.write_index(self.index, os.path.join(directory, 'index.faiss'))
+        self.data_chunks.save(os.path.join(directory, 'chunks'))
+        if self.text_index is not None:
+            self.text_index.save(os.path.join(directory, 'text_index'))
+        if self.summary_index is not None:
+            self.summary_chunks.save(os.path.join(directory, 'summaries', 'chunks'))
+            self.summary_text_index.save(os.path.join(directory, 'summaries', 'text_index'))
+            np.save(os.path.join(directory, 'summaries', 'embeddings.npy'), self.summary_embeddings)
+        if self.encoder_backend == 'hashing':
+            self.model.save(os.path.join(directory, 'encoder'))
+        
+        # The manifest is written last, so a half-written directory never loads
+        with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'encoder_id': self.encoder_id,
+                'chunks': len(self.data_chunks),
+                'index_type': self.index_type,
+                'index_params': self.index_params,
+                'vector_storage': self.vector_storage,
+                'rescore_factor': self.rescore_factor
+            }, f)
+        
+        # Directories cannot be renamed over a non-empty one, so the old copy
+        # steps aside first; its files stay readable until the last map closes
+        if os.path.exists(target):
+            retired = f"{target}.old-{os.getpid()}"
+            os.replace(target, retired)
+            os.replace(directory, target)
+            shutil.rmtree(retired)
+        else:
+            os.replace(directory, target)
         
-        print(f"✅ Saved RAG system to {filepath}")
+        print(f"✅ Saved RAG system to {target}")
     
-    def load_system(self, filepath: str):
-        """Load the RAG system from disk."""
-        if os.path.exists(filepath):
-            with open(filepath, 'rb') as f:
-                system_data = pickle.load(f)
-            
-            self.data_chunks = system_data['data_chunks']
-            self.embeddings = system_data['embeddings']
-            
-            # Recreate FAISS index
-            if self.embeddings is not None:
-                dimension = self.embeddings.shape[1]
-                self.index = faiss.IndexFlatIP(dimension)
-                faiss.normalize_L2(self.embeddings)
-                self.index.add(self.embeddings)
-            
-            print(f"✅ Loaded RAG system from {filepath}")
-            return True
+    def load_system(self, directory: str):
+        """Load the RAG system from disk, mapping the saved files read-only."""
+        manifest_path = os.path.join(directory, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return False
+        
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        built_with = manifest.get('encoder_id', manifest['model_name'])
+        if built_with != self.encoder_id:
+            print(f"❌ Saved RAG system was built with {built_with}, not {self.encoder_id}")
+            return False
+        
+        # IO_FLAG_MMAP copies the vectors and codes into private memory; the IFC
+        # flag maps them from the file, so worker processes share the pages
+        index_path = os.path.join(directory, 'index.faiss')
+        try:
+            self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+        except RuntimeError:
+            self.index = faiss.read_index(index_path)
+        
+        # The saved index's own type and parameters win over the constructor's
+        self.index_type = manifest.get('index_type', 'flat')
+        self.index_params = manifest.get('index_params', {})
+        self.rescore_factor = manifest.get('rescore_factor', self.rescore_factor)
+        set_search_params(self.index, self.index_type, self.index_params)
+        
+        # Vectors were normalized before saving, so they are used as-is; a flat
+        # index already maps them
+        self.vector_storage = manifest.get('vector_storage', 'float32')
+        if self.vector_storage == 'float32' and self.index_type == 'flat':
+            self.embeddings = flat_vectors(self.index)
+        else:
+            self.embeddings = np.load(os.path.join(directory, 'embeddings.npy'), mmap_mode='r')
+        if self.vector_storage == 'int8':
+            self.embeddings = QuantizedVectors(self.embeddings, np.load(os.path.join(directory, 'embedding_scale.npy')))
+        elif self.vector_storage == 'float16':
+            self.embeddings = QuantizedVectors(self.embeddings)
+        self.data_chunks = ChunkStore.load(os.path.join(directory, 'chunks'))
+        if os.path.exists(os.path.join(directory, 'text_index')):
+            self.text_index = BM25Index.load(os.path.join(directory, 'text_index'))
+        if os.path.exists(os.path.join(directory, 'summaries')):
+            # The summary index is small enough to rebuild from its vectors
+            self.summary_chunks = ChunkStore.load(os.path.join(directory, 'summaries', 'chunks'))
+            self.summary_text_index = BM25Index.load(os.path.join(directory, 'summaries', 'text_index'))
+            self.summary_embeddings = np.load(os.path.join(directory, 'summaries', 'embeddings.npy'), mmap_mode='r')
+            self.summary_index, _ = build_index(self.summary_embeddings, 'flat')
+        if self.encoder_backend == 'hashing':
+            self.model = HashingEncoder.load(os.path.join(directory, 'encoder'))
         
-        return False
+        print(f"✅ Loaded RAG system from {directory}")
+        return True
 
 # Example usage
 if __name__ == "__main__":
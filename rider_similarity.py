@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+class RiderSimilarity:
+    def __init__(self, schema, venue_columns=('Pick Up Address Clean', 'Drop Off Address Clean'),
+                 hours_per_bucket=4, time_weight=0.5):
+        """Build TF-IDF weighted sparse behaviour vectors for every rider.
+
+        Each rider gets one feature per venue they were picked up at or dropped
+        off at, plus one per (day of week, hour band) they rode in. Counts are
+        log-scaled, weighted by inverse document frequency so rare venues matter
+        more than campus staples, and row norms are cached for cosine scoring.
+        """
+        self.schema = schema
+        trips = schema.trips
+        checkin_users = schema.rider_positions.astype(np.int64)
+        checkin_trips = schema.checkin_trips
+        n_users = len(schema.users)
+
+        # Venue features: the part of each cleaned address before the first comma
+        rows, columns = [], []
+        feature_names = []
+        for column in venue_columns:
+            venues = trips[column].str.split(',').str[0].str.strip()
+            codes, names = pd.factorize(venues)
+            rows.append(checkin_users)
+            columns.append(codes[checkin_trips] + len(feature_names))
+            feature_names.extend(f"{column.split(' Address')[0]}: {name}" for name in names)
+
+        # Time features: day of week x hour band
+        n_bands = 24 // hours_per_bucket
+        days = trips['DayOfWeek'].map({day: i for i, day in enumerate(DAYS)}).to_numpy()
+        buckets = days * n_bands + trips['Hour'].to_numpy() // hours_per_bucket
+        rows.append(checkin_users)
+        columns.append(buckets[checkin_trips] + len(feature_names))
+        feature_names.extend(
+            f"{day} {band * hours_per_bucket:02d}-{(band + 1) * hours_per_bucket:02d}h"
+            for day in DAYS for band in range(n_bands)
+        )
+        self.feature_names = feature_names
+
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n_users, len(feature_names)))
+        block_weights = sparse.diags(np.concatenate([
+            np.ones(len(feature_names) - 7 * n_bands), np.full(7 * n_bands, time_weight)
+        ]))
+
+        # TF-IDF: log-scaled counts times smoothed inverse document frequency
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log((1 + n_users) / (1 + document_frequency)) + 1
+        tf = counts.copy()
+        tf.data = np.log1p(tf.data)
+        self.vectors = (tf @ sparse.diags(idf) @ block_weights).tocsr()
+        self.norms = np.sqrt(np.asarray(self.vectors.multiply(self.vectors).sum(axis=1)).ravel())
+
+    def _result(self, positions, scores):
+        """Attach user IDs and demographics to scored user positions."""
+        similar = self.schema.users.iloc[positions].reset_index(drop=True)
+        similar.insert(1, 'Similarity', np.round(scores, 4))
+        return similar
+
+    def similar(self, user_id, top_k=10):
+        """Return the ``top_k`` riders whose behaviour is most similar to a user's."""
+        if user_id not in self.schema.user_index:
+            return pd.DataFrame(columns=['User ID', 'Similarity'])
+
+        position = self.schema.user_index.get_loc(user_id)
+        dots = np.asarray((self.vectors @ self.vectors[position].T).todense()).ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.nan_to_num(dots / (self.norms * self.norms[position]))
+        scores[position] = -1
+
+        top_k = min(top_k, len(scores) - 1)
+        top = np.argpartition(-scores, top_k)[:top_k] if top_k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return self._result(top, scores[top])
+
+    def similar_batch(self, top_k=10, memory_budget=2 ** 28):
+        """Score all riders against each other and return each rider's top matches.
+
+        Rows are L2-normalized once and multiplied block by block. Each block of
+        scores stays sparse and top matches are ranked from its non-zero entries;
+        the block height is derived from ``memory_budget`` (bytes) and the number
+        of riders, so even a block where every pair overlaps stays within it.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            inverse_norms = np.where(self.norms > 0, 1 / self.norms, 0)
+        normalized = (sparse.diags(inverse_norms) @ self.vectors).tocsr()
+        transposed = normalized.T.tocsc()
+
+        n_users = normalized.shape[0]
+        top_k = max(min(top_k, n_users - 1), 0)
+        # ~48 bytes per stored score: CSR data/indices plus the row, order and rank arrays below
+        block_size = max(1, memory_budget // (48 * max(n_users, 1)))
+        neighbours = np.full((n_users, top_k), -1, dtype=np.int64)
+        scores = np.zeros((n_users, top_k))
+        for start in range(0, n_users, block_size):
+            block = (normalized[start:start + block_size] @ transposed).tocsr()
+            rows = np.repeat(np.arange(block.shape[0]), np.diff(block.indptr))
+            columns, values = block.indices, block.data
+            keep = (columns != rows + start) & (values > 0)
+            rows, columns, values = rows[keep], columns[keep], values[keep]
+
+            # Rank each row's scores high to low (ties by position) and keep the first top_k
+            order = np.lexsort((columns, -values, rows))
+            rows, columns, values = rows[order], columns[order], values[order]
+            counts = np.bincount(rows, minlength=block.shape[0])
+            rank = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+            top = rank < top_k
+            neighbours[start + rows[top], rank[top]] = columns[top]
+            scores[start + rows[top], rank[top]] = values[top]
+
+        # Riders with fewer than top_k overlapping riders get fewer rows
+        found = neighbours.ravel() >= 0
+        user_ids = self.schema.users['User ID'].to_numpy()
+        return pd.DataFrame({
+            'User ID': np.repeat(user_ids, top_k)[found],
+            'Similar User ID': user_ids[neighbours.ravel()[found]],
+            'Similarity': np.round(scores.ravel()[found], 4)
+        })
@@ -0,0 +1,243 @@
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Cell offsets reachable within eps when cells have side eps / sqrt(2)
+_NEIGHBOUR_OFFSETS = [
+    (dx, dy)
+    for dx in range(-2, 3)
+    for dy in range(-2, 3)
+    if abs(dx) + abs(dy) < 4
+]
+
+
+def project_to_meters(lat, lon, ref_lat=None):
+    """Project latitude/longitude degrees onto a local planar grid in metres."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if ref_lat is None:
+        ref_lat = float(np.nanmean(lat)) if len(lat) else 0.0
+
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(np.radians(ref_lat))
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+
+class SpatialGrid:
+    def __init__(self, x, y, cell_size):
+        """Bucket planar points into square cells for fixed-radius lookups.
+
+        Points with a NaN coordinate are left out of every cell.
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.cell_size = float(cell_size)
+        valid = ~(np.isnan(self.x) | np.isnan(self.y))
+
+        self.cell_x = np.floor(np.where(valid, self.x, 0) / self.cell_size).astype(np.int64)
+        self.cell_y = np.floor(np.where(valid, self.y, 0) / self.cell_size).astype(np.int64)
+
+        # Sort points by cell so each cell is one contiguous slice
+        points = np.flatnonzero(valid)
+        self.order = points[np.lexsort((self.cell_y[points], self.cell_x[points]))]
+        sorted_x = self.cell_x[self.order]
+        sorted_y = self.cell_y[self.order]
+        boundaries = np.flatnonzero((np.diff(sorted_x) != 0) | (np.diff(sorted_y) != 0)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(self.order) else np.array([], dtype=np.int64)
+        ends = np.concatenate((boundaries, [len(self.order)])) if len(self.order) else np.array([], dtype=np.int64)
+
+        self.cells = {
+            (int(sorted_x[s]), int(sorted_y[s])): self.order[s:e]
+            for s, e in zip(starts, ends)
+        }
+
+    def members(self, cell):
+        """Return the point indices stored in a cell."""
+        return self.cells.get(cell, np.array([], dtype=np.int64))
+
+    def neighbourhood(self, cell, offsets=_NEIGHBOUR_OFFSETS):
+        """Return the point indices of all cells around a cell."""
+        parts = [
+            self.cells[(cell[0] + dx, cell[1] + dy)]
+            for dx, dy in offsets
+            if (cell[0] + dx, cell[1] + dy) in self.cells
+        ]
+        return np.concatenate(parts) if parts else np.array([], dtype=np.int64)
+
+
+def _any_within(x, y, a, b, eps_sq, chunk_size=2048):
+    """Check whether any point of ``a`` lies within eps of any point of ``b``."""
+    for start in range(0, len(a), chunk_size):
+        block = a[start:start + chunk_size]
+        d_sq = (x[block, None] - x[b]) ** 2 + (y[block, None] - y[b]) ** 2
+        if (d_sq <= eps_sq).any():
+            return True
+    return False
+
+
+def grid_dbscan(x, y, eps, min_samples):
+    """Cluster planar points with DBSCAN, accelerated by a uniform grid.
+
+    Cells have side eps / sqrt(2), so every pair of points inside one cell is
+    within eps: a cell holding ``min_samples`` points is entirely core, and only
+    the 21 surrounding cells are ever compared. Work is linear in the number of
+    points for bounded density. Returns one label per point, -1 for noise and
+    for points with a NaN coordinate.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    labels = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return labels
+
+    eps_sq = float(eps) ** 2
+    grid = SpatialGrid(x, y, eps / np.sqrt(2))
+
+    # Core points: dense cells are core outright, sparse cells count neighbours
+    is_core = np.zeros(n, dtype=bool)
+    for cell, members in grid.cells.items():
+        if len(members) >= min_samples:
+            is_core[members] = True
+            continue
+        candidates = grid.neighbourhood(cell)
+        d_sq = (x[members, None] - x[candidates]) ** 2 + (y[members, None] - y[candidates]) ** 2
+        is_core[members] = (d_sq <= eps_sq).sum(axis=1) >= min_samples
+
+    core_cells = {}
+    for cell, members in grid.cells.items():
+        core_members = members[is_core[members]]
+        if len(core_members):
+            core_cells[cell] = core_members
+
+    # Union neighbouring core cells that share a core pair within eps
+    parent = {cell: cell for cell in core_cells}
+
+    def find(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    for cell, core_members in core_cells.items():
+        for dx, dy in _NEIGHBOUR_OFFSETS:
+            other = (cell[0] + dx, cell[1] + dy)
+            if other <= cell or other not in core_cells:
+                continue
+            root_a, root_b = find(cell), find(other)
+            if root_a == root_b:
+                continue
+            if _any_within(x, y, core_members, core_cells[other], eps_sq):
+                parent[root_b] = root_a
+
+    cluster_ids = {}
+    for cell, core_members in core_cells.items():
+        root = find(cell)
+        if root not in cluster_ids:
+            cluster_ids[root] = len(cluster_ids)
+        labels[core_members] = cluster_ids[root]
+
+    # Border points join the cluster of their nearest core point within eps
+    for cell, members in grid.cells.items():
+        border = members[~is_core[members]]
+        if not len(border):
+            continue
+        candidates = grid.neighbourhood(cell)
+        candidates = candidates[is_core[candidates]]
+        if not len(candidates):
+            continue
+        d_sq = (x[border, None] - x[candidates]) ** 2 + (y[border, None] - y[candidates]) ** 2
+        nearest = d_sq.argmin(axis=1)
+        reachable = d_sq[np.arange(len(border)), nearest] <= eps_sq
+        labels[border[reachable]] = labels[candidates[nearest[reachable]]]
+
+    return labels
+
+
+def spatiotemporal_pairs(x, y, t, radius, window):
+    """Find all pairs of points within ``radius`` metres and ``window`` time units.
+
+    Points are sorted once by (grid cell, time); for every point and each of the
+    nine surrounding cells a binary search finds the run of candidates inside the
+    time window, so only near-in-time, near-in-space candidates are ever compared.
+    Points with a NaN coordinate or a NaT time pair with nothing. Returns (i, j)
+    index arrays with i < j.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    t = np.asarray(t, dtype=np.int64)
+    n = len(x)
+    if n == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    # NaN would floor to INT64_MIN cells and NaT is INT64_MIN, so pair the rest only
+    valid = ~(np.isnan(x) | np.isnan(y)) & (t != np.iinfo(np.int64).min)
+    if not valid.all():
+        points = np.flatnonzero(valid)
+        i, j = spatiotemporal_pairs(x[points], y[points], t[points], radius, window)
+        return points[i], points[j]
+
+    cell_x = np.floor(x / radius).astype(np.int64)
+    cell_y = np.floor(y / radius).astype(np.int64)
+    cell_x -= cell_x.min() - 1
+    cell_y -= cell_y.min() - 1
+    height = int(cell_y.max()) + 2
+    cell_keys = cell_x * height + cell_y
+
+    # Composite sort key: dense cell rank, then time offset within the span
+    unique_cells, cell_rank = np.unique(cell_keys, return_inverse=True)
+    offsets = t - t.min()
+    span = int(offsets.max()) + 2 * int(window) + 1
+    composite = cell_rank * span + offsets + window
+    order = np.argsort(composite, kind='stable')
+    sorted_composite = composite[order]
+    sorted_keys = cell_keys[order]
+    sorted_offsets = offsets[order]
+
+    # Queries are issued in sorted order so the binary searches stay cache friendly
+    pair_i, pair_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour_keys = sorted_keys + dx * height + dy
+            rank = np.searchsorted(unique_cells, neighbour_keys)
+            exists = (rank < len(unique_cells)) & (unique_cells[np.minimum(rank, len(unique_cells) - 1)] == neighbour_keys)
+            sources = np.flatnonzero(exists)
+            base = rank[sources] * span + sorted_offsets[sources] + window
+            lo = np.searchsorted(sorted_composite, base - window, side='left')
+            hi = np.searchsorted(sorted_composite, base + window, side='right')
+
+            counts = hi - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+            positions = np.repeat(lo, counts) + np.arange(total) - run_starts
+            i = order[np.repeat(sources, counts)]
+            j = order[positions]
+
+            keep = (i < j) & ((x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= radius ** 2)
+            pair_i.append(i[keep])
+            pair_j.append(j[keep])
+
+    if not pair_i:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(pair_i), np.concatenate(pair_j)
+
+
+def connected_components(n, i, j):
+    """Label the connected components of an undirected graph given as edge arrays."""
+    labels = np.arange(n)
+    i = np.asarray(i, dtype=np.int64)
+    j = np.asarray(j, dtype=np.int64)
+
+    # Min-label propagation with pointer jumping until no label changes
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, i, labels[j])
+        np.minimum.at(updated, j, labels[i])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    return np.unique(labels, return_inverse=True)[1]
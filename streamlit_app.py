@@ -4,7 +4,7 @@ import os
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from data_processor import FetiiDataProcessor
+from data_processor import FetiiDataProcessor, AGE_GROUPS
 import re
 
 # Try to import Gemini AI, fallback to rule-based if not available
@@ -14,6 +14,9 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+# Downtown Austin, where the density map opens
+MAP_CENTER = (30.2672, -97.7431)
+
 class FetiiChatbot:
     def __init__(self):
         """Initialize the Fetii chatbot."""
@@ -70,34 +73,159 @@ class FetiiChatbot:
             # Check for specific query patterns
             
             # 0. Specific user queries (age, demographics, etc.)
+            profile = None
+            user_id = None
             if any(keyword in query_lower for keyword in ['age of user', 'user id', 'userid', 'user']):
                 user_id = self._extract_user_id(user_query)
                 if user_id:
-                    user_data = self.processor.query_data('specific_user', user_id=user_id)
-                    result['query_type'] = 'specific_user'
-                    result['data'] = user_data
+                    profile = self.processor.query_data('user_profile', user_id=user_id)
+            
+            if profile and any(keyword in query_lower for keyword in ['similar', 'lookalike', 'look-alike', 'behave like', 'like user']):
+                similar = self.processor.query_data('similar_riders', user_id=user_id, top_k=10)
+                result['query_type'] = 'similar_riders'
+                result['data'] = similar
+                result['summary'] = f"Found {len(similar)} riders similar to User ID {user_id}"
+                result['detailed_response'] = f"""
+                **Riders who behave like User ID {user_id}:**
+                (matched on the venues they ride to and from and when they ride)
+                """
+                for _, rider in similar.iterrows():
+                    age = f", age {rider['Age']:.0f}" if pd.notna(rider['Age']) else ""
+                    result['detailed_response'] += f"\n- User {rider['User ID']}: similarity {rider['Similarity']:.2f}{age}"
+            
+            elif profile:
+                result['query_type'] = 'specific_user'
+                result['data'] = self.processor.query_data('specific_user', user_id=user_id)
+                result['summary'] = f"Found information for User ID {user_id}"
+                result['detailed_response'] = f"""
+                **User ID {user_id} Information:**
+                - Age: {profile['Age'] if pd.notna(profile['Age']) else 'Not available'}
+                - Age Group: {profile['Age Group']}
+                - Total Trips: {profile['Trip Count']}
+                - First Seen: {profile['First Seen']:%Y-%m-%d}
+                - Most Recent Trip: {profile['Latest Trip']} (Trip ID {profile['Latest Trip ID']})
+                - Common Pickup: {profile['Top Pickup']} ({profile['Top Pickup Category']})
+                - Common Dropoff: {profile['Top Drop Off']} ({profile['Top Drop Off Category']})
+                """
+                
+                # Frequent companions from the co-rider graph
+                companions = self.processor.query_data('companions', user_id=user_id, top_k=3)
+                if len(companions) > 0:
+                    result['detailed_response'] += "\n**Frequent Companions:**"
+                    for _, companion in companions.iterrows():
+                        result['detailed_response'] += f"\n- User {companion['User ID']}: {companion['Shared Trips']} shared trips"
+            
+            elif user_id and re.search(r'user\s*(?:id\s*)?\d+', query_lower):
+                result['query_type'] = 'specific_user'
+                result['summary'] = f"No data found for User ID {user_id}"
+                result['detailed_response'] = f"Sorry, I couldn't find any data for User ID {user_id} in the Fetii dataset."
+            
+            elif any(keyword in query_lower for keyword in ['age of user', 'user id', 'userid']):
+                result['query_type'] = 'specific_user'
+                result['summary'] = "Could not extract user ID from query"
+                result['detailed_response'] = "Please provide a specific user ID (e.g., 'age of user 8794')"
+            
+            # 1. Demand hot spots (where to stage vehicles)
+            elif any(keyword in query_lower for keyword in ['hotspot', 'hot spot', 'stage', 'staging', 'where should']):
+                point = 'dropoff' if any(keyword in query_lower for keyword in ['drop-off', 'dropoff', 'drop off']) else 'pickup'
+                day_of_week = self._extract_day_of_week(user_query)
+                start_hour, end_hour = self._extract_hour_window(user_query)
+                min_size = self._extract_min_riders(user_query)
+                
+                hotspots = self.processor.query_data(
+                    'hotspots',
+                    point=point,
+                    day_of_week=day_of_week,
+                    start_hour=start_hour,
+                    end_hour=end_hour,
+                    min_size=min_size
+                )
+                
+                result['query_type'] = 'hotspots'
+                result['data'] = hotspots
+                result['summary'] = f"Found {len(hotspots)} {point} hot spots"
+                
+                # Create detailed response
+                if len(hotspots) > 0:
+                    result['detailed_response'] = f"""
+                    I found **{len(hotspots)} {point} hot spots** where demand clusters.
+                    
+                    **Top Staging Locations:**
+                    """
+                    for _, spot in hotspots.head(5).iterrows():
+                        result['detailed_response'] += f"\n- {spot['Top Address']}: {spot['Trips']} trips, {spot['Total Passengers']} riders (within ~{spot['Radius (m)']:.0f} m)"
+                    
+                    # Create visualization
+                    result['visualization'] = self._create_hotspot_visualization(hotspots)
+                else:
+                    result['detailed_response'] = "No demand hot spots found for the specified filters."
+            
+            # 2. Event windows around venues
+            elif any(keyword in query_lower for keyword in ['event', 'doors', 'concert']):
+                venue = self._extract_venue(user_query)
+                minutes_before_doors = 60 if 'before doors' in query_lower else None
+                
+                event_trips = self.processor.query_data(
+                    'event_trips',
+                    venue=venue,
+                    minutes_before_doors=minutes_before_doors
+                )
+                
+                result['query_type'] = 'event_trips'
+                result['data'] = event_trips
+                window = "in the hour before doors" if minutes_before_doors else "during events"
+                result['summary'] = f"Found {len(event_trips)} trips {window} at {venue or 'all venues'}"
+                
+                # Create detailed response
+                if len(event_trips) > 0:
+                    events = event_trips.groupby('Event ID').agg(
+                        Venue=('Drop Off Address Clean', 'first'),
+                        Doors=('Doors', 'first'),
+                        Trips=('Trip ID', 'size'),
+                        Riders=('Total Passengers', 'sum')
+                    ).sort_values('Trips', ascending=False)
+                    result['detailed_response'] = f"""
+                    I found **{len(event_trips)} trips** {window} across **{len(events)} events** at {venue or 'all venues'}.
+                    
+                    **Busiest Events:**
+                    """
+                    for _, event in events.head(5).iterrows():
+                        result['detailed_response'] += f"\n- {event['Venue']} (doors ~{event['Doors']:%a %b %d %H:%M}): {event['Trips']} trips, {event['Riders']} riders"
                     
-                    if len(user_data) > 0:
-                        user_info = user_data.iloc[0]
-                        result['summary'] = f"Found information for User ID {user_id}"
-                        result['detailed_response'] = f"""
-                        **User ID {user_id} Information:**
-                        - Age: {user_info.get('Age', 'Not available')}
-                        - Age Group: {user_info.get('Age Group', 'Not available')}
-                        - Total Trips: {len(user_data)}
-                        - Most Recent Trip: {user_info.get('Trip Date and Time', 'Not available')}
-                        - Common Pickup: {user_info.get('Pick Up Category', 'Not available')}
-                        - Common Dropoff: {user_info.get('Drop Off Category', 'Not available')}
-                        """
-                    else:
-                        result['summary'] = f"No data found for User ID {user_id}"
-                        result['detailed_response'] = f"Sorry, I couldn't find any data for User ID {user_id} in the Fetii dataset."
+                    # Create visualization
+                    result['visualization'] = self._create_trip_visualization(event_trips, venue)
                 else:
-                    result['summary'] = "Could not extract user ID from query"
-                    result['detailed_response'] = "Please provide a specific user ID (e.g., 'age of user 8794')"
+                    result['detailed_response'] = f"No event arrivals found at {venue or 'any venue'}."
             
-            # 1. Trips to specific location
-            if any(keyword in query_lower for keyword in ['went to', 'go to', 'trips to', 'groups to']):
+            elif any(keyword in query_lower for keyword in ['retention', 'cohort', 'come back', 'returning']):
+                period = 'month' if 'month' in query_lower else 'week'
+                retention = self.processor.query_data('cohort_retention', period=period)
+                
+                result['query_type'] = 'cohort_retention'
+                result['data'] = retention
+                result['summary'] = f"Retention for {len(retention)} {period}ly rider cohorts"
+                
+                # Create detailed response
+                result['detailed_response'] = f"""
+                Riders are grouped by the {period} of their first trip. **{retention['Cohort Size'].sum()} riders** across **{len(retention)} cohorts**.
+                
+                **Cohorts:**
+                """
+                for cohort, row in retention.iterrows():
+                    returned = f"{row[1]:.1%} rode again the next {period}" if 1 in retention.columns else "no later activity yet"
+                    result['detailed_response'] += f"\n- {cohort}: {int(row['Cohort Size'])} new riders, {returned}"
+                
+                # Create visualization
+                result['visualization'] = px.imshow(
+                    retention.drop(columns='Cohort Size'),
+                    labels=dict(x=f"{period.title()}s Since First Trip", y="Cohort", color="Retention"),
+                    title=f"Rider Retention by {period.title()}ly Cohort",
+                    color_continuous_scale='Blues',
+                    text_auto='.0%'
+                )
+            
+            # 3. Trips to specific location
+            elif any(keyword in query_lower for keyword in ['went to', 'go to', 'trips to', 'groups to']):
                 location = self._extract_location(user_query)
                 time_period = self._extract_time_period(user_query)
                 
@@ -128,7 +256,7 @@ class FetiiChatbot:
                 else:
                     result['detailed_response'] = f"No trips found to {location or 'the specified location'} in the dataset."
             
-            # 2. Demographic analysis (age groups, drop-off spots)
+            # 4. Demographic analysis (age groups, drop-off spots)
             elif any(keyword in query_lower for keyword in ['drop-off', 'dropoff', 'drop off', 'age', 'year old']):
                 age_group = self._extract_age_group(user_query)
                 day_of_week = self._extract_day_of_week(user_query)
@@ -161,7 +289,7 @@ class FetiiChatbot:
                 else:
                     result['detailed_response'] = "No data found matching the specified demographic criteria."
             
-            # 3. Large group analysis
+            # 5. Large group analysis
             elif any(keyword in query_lower for keyword in ['large group', '6+', 'big group', 'group size']):
                 min_size = self._extract_group_size(user_query)
                 location = self._extract_location(user_query)
@@ -187,14 +315,21 @@ class FetiiChatbot:
                     - Average group size: {avg_size:.1f} passengers
                     - Largest group: {max_size} passengers
                     - Most common time: {trips['Hour'].mode().iloc[0] if len(trips) > 0 else 'N/A'}:00
+                    - Average rider age: {trips['Mean Rider Age'].mean():.1f}
+                    
+                    **Age Mix of Checked-in Riders:**
                     """
+                    for age_group in AGE_GROUPS:
+                        riders = trips[f'Riders {age_group}'].sum()
+                        if riders > 0:
+                            result['detailed_response'] += f"\n- {age_group}: {riders} riders"
                     
                     # Create visualization
                     result['visualization'] = self._create_group_size_visualization(trips)
                 else:
                     result['detailed_response'] = f"No trips found with {min_size}+ passengers."
             
-            # 4. General data summary
+            # 6. General data summary
             else:
                 summary = self.processor.get_data_summary()
                 result['query_type'] = 'summary'
@@ -249,6 +384,18 @@ class FetiiChatbot:
         
         return None
     
+    def _extract_venue(self, query):
+        """Extract a venue name from user query."""
+        location = self._extract_location(query)
+        if location:
+            return location
+        
+        match = re.search(r"\b(?:at|to)\s+(?:the\s+)?([a-z0-9'&. ]+?)(?:\s+(?:during|before|on|in|last|this)\b|[?,.!]|$)", query.lower())
+        if match:
+            return match.group(1).strip()
+        
+        return None
+    
     def _extract_time_period(self, query):
         """Extract time period from user query."""
         query_lower = query.lower()
@@ -312,6 +459,31 @@ class FetiiChatbot:
         
         return 6  # Default to 6+ for large groups
     
+    def _extract_hour_window(self, query):
+        """Extract an hour window like '10pm-2am' from user query."""
+        match = re.search(r'(\d{1,2})\s*(am|pm)?\s*(?:-|–|to)\s*(\d{1,2})\s*(am|pm)', query.lower())
+        if not match:
+            if self._extract_time_of_day(query) == 'night':
+                return 18, 24
+            return None, None
+        
+        start, start_suffix, end, end_suffix = match.groups()
+        start_suffix = start_suffix or end_suffix
+        
+        def to_24h(hour, suffix):
+            hour = int(hour) % 12
+            return hour + 12 if suffix == 'pm' else hour
+        
+        return to_24h(start, start_suffix), to_24h(end, end_suffix)
+    
+    def _extract_min_riders(self, query):
+        """Extract a minimum rider count like '6+ riders' from user query."""
+        match = re.search(r'(\d+)\s*(?:\+|or more)', query.lower())
+        if match:
+            return int(match.group(1))
+        
+        return None
+    
     def _extract_user_id(self, query):
         """Extract user ID from user query."""
         import re
@@ -387,6 +559,47 @@ class FetiiChatbot:
         
         return fig
     
+    def _create_hotspot_visualization(self, hotspots):
+        """Create map visualization for demand hot spots."""
+        if len(hotspots) == 0:
+            return None
+        
+        # Create a map of hot spot centres sized by trip volume
+        fig = px.scatter_mapbox(
+            hotspots,
+            lat='Latitude',
+            lon='Longitude',
+            size='Trips',
+            color='Total Passengers',
+            hover_name='Top Address',
+            zoom=12,
+            title='Demand Hot Spots'
+        )
+        
+        fig.update_layout(mapbox_style='open-street-map')
+        
+        return fig
+    
+    def _create_density_map(self, cells, zoom):
+        """Create a WebGL density map from aggregated tile cells."""
+        fig = go.Figure(go.Densitymapbox(
+            lat=cells['Latitude'],
+            lon=cells['Longitude'],
+            z=cells['Trips'],
+            radius=12,
+            customdata=cells[['Trips', 'Total Passengers']],
+            hovertemplate='%{customdata[0]} trips<br>%{customdata[1]} riders<extra></extra>'
+        ))
+        
+        fig.update_layout(
+            mapbox_style='open-street-map',
+            mapbox_zoom=zoom,
+            mapbox_center={'lat': MAP_CENTER[0], 'lon': MAP_CENTER[1]},
+            margin={'l': 0, 'r': 0, 't': 0, 'b': 0}
+        )
+        
+        return fig
+    
     def generate_response(self, user_query, analysis_result):
         """Generate a natural language response using Gemini AI or fallback to rule-based."""
         if self.gemini_model is None:
@@ -497,6 +710,14 @@ def main():
                 
                 # Clear the input
                 st.session_state.user_input = ''
+        
+        # Trip density map backed by pre-aggregated tiles
+        with st.expander("🗺️ Trip Density Map"):
+            point = st.radio("Show", ['pickup', 'dropoff'], horizontal=True, format_func=lambda p: f"{p.title()} density")
+            zoom = st.slider("Zoom level", min_value=8, max_value=16, value=12)
+            cells = st.session_state.chatbot.processor.query_data('density_map', point=point, zoom=zoom, center=MAP_CENTER)
+            st.plotly_chart(st.session_state.chatbot._create_density_map(cells, zoom), use_container_width=True)
+            st.caption(f"{len(cells):,} aggregated cells covering {cells['Trips'].sum():,} trips")
     
     with col2:
         st.markdown("### 🎯 Quick Stats")
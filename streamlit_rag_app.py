@@ -6,11 +6,22 @@ import plotly.express as px
 import plotly.graph_objects as go
 from rag_system import FetiiRAGSystem
 import os
+import shutil
 from dotenv import load_dotenv
 import numpy as np
 
 load_dotenv()
 
+# Directory holding the saved RAG index, embeddings and chunk columns
+RAG_SYSTEM_DIR = 'fetii_rag_system'
+
+# Query embeddings survive restarts and RAG refreshes
+QUERY_CACHE_PATH = os.path.join('embedding_cache', 'queries')
+
+# Embedding backend for this deployment: 'torch', 'onnx', 'onnx-int8', or
+# 'hashing' where the transformer weights cannot be downloaded
+ENCODER_BACKEND = os.getenv('FETII_ENCODER_BACKEND', 'torch')
+
 class FetiiRAGChatbot:
     def __init__(self):
         self.rag_system = None
@@ -35,10 +46,11 @@ class FetiiRAGChatbot:
     
     def load_rag_system(self):
         """Load or create the RAG system."""
-        if os.path.exists('fetii_rag_system.pkl'):
+        if os.path.exists(RAG_SYSTEM_DIR):
             st.info("🔄 Loading existing RAG system...")
-            self.rag_system = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx')
-            if self.rag_system.load_system('fetii_rag_system.pkl'):
+            self.rag_system = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', query_cache_path=QUERY_CACHE_PATH,
+                                             encoder_backend=ENCODER_BACKEND, warm_up=True)
+            if self.rag_system.load_system(RAG_SYSTEM_DIR):
                 st.success("✅ RAG system loaded successfully!")
             else:
                 st.error("❌ Failed to load RAG system. Creating new one...")
@@ -50,11 +62,12 @@ class FetiiRAGChatbot:
     def _create_new_rag_system(self):
         """Create a new RAG system from scratch."""
         with st.spinner("Creating RAG system... This may take a few minutes."):
-            self.rag_system = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx')
+            self.rag_system = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', query_cache_path=QUERY_CACHE_PATH,
+                                             encoder_backend=ENCODER_BACKEND, warm_up=True)
             self.rag_system.load_and_process_data()
             self.rag_system.create_data_chunks()
             self.rag_system.create_embeddings()
-            self.rag_system.save_system('fetii_rag_system.pkl')
+            self.rag_system.save_system(RAG_SYSTEM_DIR)
             st.success("✅ RAG system created and saved!")
     
     def generate_response(self, user_query):
@@ -188,8 +201,8 @@ def main():
         """)
         
         if st.button("🔄 Refresh RAG System"):
-            if os.path.exists('fetii_rag_system.pkl'):
-                os.remove('fetii_rag_system.pkl')
+            if os.path.exists(RAG_SYSTEM_DIR):
+                shutil.rmtree(RAG_SYSTEM_DIR)
             st.session_state.chatbot = FetiiRAGChatbot()
             st.rerun()
     
@@ -232,7 +245,7 @@ def main():
     with col2:
         st.subheader("📊 Quick Stats")
         
-        if chatbot.rag_system and chatbot.rag_system.data_chunks:
+        if chatbot.rag_system and len(chatbot.rag_system.data_chunks) > 0:
             total_chunks = len(chatbot.rag_system.data_chunks)
             st.metric("Data Chunks", f"{total_chunks:,}")
             
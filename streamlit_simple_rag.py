@@ -79,63 +79,65 @@ class SimpleFetiiRAG:
             return "Other"
     
     def search_data(self, query, top_k=5):
-        """Search for relevant data using simple text matching."""
+        """Search for relevant data using simple text matching.
+        
+        Each criterion scores all records at once as a column mask, so only the
+        top matches are ever turned into row dicts.
+        """
         query_lower = query.lower()
-        results = []
+        data = self.processed_data
+        scores = np.zeros(len(data), dtype=np.int64)
         
-        # Search through all records
-        for idx, row in self.processed_data.iterrows():
-            score = 0
-            
-            # Check trip ID matches (highest priority)
-            if any(keyword in query_lower for keyword in ['trip id', 'tripid', 'trip']):
-                trip_id = self._extract_trip_id(query)
-                if trip_id and row.get('Trip ID') == trip_id:
-                    score += 20  # Highest priority for exact trip ID match
-            
-            # Check user ID matches
-            if any(keyword in query_lower for keyword in ['user', 'age of user', 'userid']):
-                user_id = self._extract_user_id(query)
-                if user_id and row.get('User ID') == user_id:
-                    score += 10
-            
-            # Check location matches
-            if any(keyword in query_lower for keyword in ['moody center', 'downtown', 'university', 'airport']):
-                location = self._extract_location(query)
-                if location.lower() in str(row.get('Drop Off Address', '')).lower() or \
-                   location.lower() in str(row.get('Drop Off Category', '')).lower():
-                    score += 5
-            
-            # Check age group matches
-            if any(keyword in query_lower for keyword in ['age', 'year old', '18-24', '25-34']):
-                age_group = self._extract_age_group(query)
-                if age_group and str(row.get('Age Group', '')).lower() == age_group.lower():
-                    score += 5
-            
-            # Check day/time matches
-            if any(keyword in query_lower for keyword in ['saturday', 'sunday', 'night', 'morning']):
-                if 'saturday' in query_lower and row.get('DayOfWeek') == 'Saturday':
-                    score += 3
-                if 'sunday' in query_lower and row.get('DayOfWeek') == 'Sunday':
-                    score += 3
-                if 'night' in query_lower and row.get('Hour', 0) >= 18:
-                    score += 3
-            
-            # Check group size matches
-            if any(keyword in query_lower for keyword in ['large group', '6+', 'group size']):
-                if row.get('Total Passengers', 0) >= 6:
-                    score += 3
-            
-            if score > 0:
-                results.append({
-                    'score': score,
-                    'data': row.to_dict(),
-                    'index': idx
-                })
+        def column(name, default):
+            return data[name] if name in data.columns else pd.Series(default, index=data.index)
+        
+        # Check trip ID matches (highest priority)
+        if any(keyword in query_lower for keyword in ['trip id', 'tripid', 'trip']):
+            trip_id = self._extract_trip_id(query)
+            if trip_id:
+                scores += 20 * (column('Trip ID', None) == trip_id).to_numpy()
+        
+        # Check user ID matches
+        if any(keyword in query_lower for keyword in ['user', 'age of user', 'userid']):
+            user_id = self._extract_user_id(query)
+            if user_id:
+                scores += 10 * (column('User ID', None) == user_id).to_numpy()
+        
+        # Check location matches
+        if any(keyword in query_lower for keyword in ['moody center', 'downtown', 'university', 'airport']):
+            location = self._extract_location(query).lower()
+            matches = (
+                column('Drop Off Address', '').astype(str).str.lower().str.contains(location, regex=False) |
+                column('Drop Off Category', '').astype(str).str.lower().str.contains(location, regex=False)
+            )
+            scores += 5 * matches.to_numpy()
+        
+        # Check age group matches
+        if any(keyword in query_lower for keyword in ['age', 'year old', '18-24', '25-34']):
+            age_group = self._extract_age_group(query)
+            if age_group:
+                scores += 5 * (column('Age Group', '').astype(str).str.lower() == age_group.lower()).to_numpy()
+        
+        # Check day/time matches
+        if any(keyword in query_lower for keyword in ['saturday', 'sunday', 'night', 'morning']):
+            if 'saturday' in query_lower:
+                scores += 3 * (column('DayOfWeek', None) == 'Saturday').to_numpy()
+            if 'sunday' in query_lower:
+                scores += 3 * (column('DayOfWeek', None) == 'Sunday').to_numpy()
+            if 'night' in query_lower:
+                scores += 3 * (column('Hour', 0) >= 18).to_numpy()
+        
+        # Check group size matches
+        if any(keyword in query_lower for keyword in ['large group', '6+', 'group size']):
+            scores += 3 * (column('Total Passengers', 0) >= 6).to_numpy()
         
         # Sort by score and return top results
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:top_k]
+        matched = np.flatnonzero(scores > 0)
+        top = matched[np.argsort(-scores[matched], kind='stable')][:top_k]
+        return [
+            {'score': int(scores[i]), 'data': data.iloc[i].to_dict(), 'index': data.index[i]}
+            for i in top
+        ]
     
     def _extract_trip_id(self, query):
         """Extract trip ID from query."""
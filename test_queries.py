@@ -5,6 +5,24 @@ Test script to validate the FetiiAI chatbot functionality
 
 from data_processor import FetiiDataProcessor
 from fetii_chatbot_demo import FetiiChatbotDemo
+from chunk_store import ChunkStore
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, text_keys
+from vector_index import build_index, recall_at_k, rescore, QuantizedVectors, IndexVectors
+from text_index import BM25Index, reciprocal_rank_fusion
+from encoders import create_encoder, cosine_agreement, encoder_id, HashingEncoder
+from query_service import QueryService
+from rag_system import FetiiRAGSystem
+from map_tiles import TilePyramid, viewport_bounds, _to_mercator
+from interval_index import IntervalTree
+from spatial_index import grid_dbscan, spatiotemporal_pairs
+from trip_schema import TripSchema, UserHistoryIndex
+from corider_graph import CoRiderGraph
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import tempfile
+import os
 
 def test_data_processor():
     """Test the data processor functionality."""
@@ -56,6 +74,791 @@ def test_specific_queries():
     
     return True
 
+def test_hotspot_queries():
+    """Test demand hot-spot clustering."""
+    print("\n🧪 Testing Hot Spot Queries...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    
+    # "Where should we stage vehicles Saturday 10pm-2am for 6+ riders?"
+    hotspots = processor.query_data('hotspots', day_of_week='Saturday', start_hour=22, end_hour=2, min_size=6)
+    print(f"   Found {len(hotspots)} pickup hot spots for Saturday 10pm-2am, 6+ riders")
+    for _, spot in hotspots.head(3).iterrows():
+        print(f"   - {spot['Top Address']}: {spot['Trips']} trips")
+    
+    assert hotspots['Trips'].is_monotonic_decreasing
+    assert processor.query_data('hotspots', day_of_week='Saturday', start_hour=22, end_hour=2, min_size=6) is hotspots
+    
+    # Points without coordinates are noise, and the rest cluster as if they were absent
+    rng = np.random.default_rng(0)
+    x, y = rng.normal(0, 50, 400), rng.normal(0, 50, 400)
+    x[::7], y[3::11] = np.nan, np.nan
+    valid = ~(np.isnan(x) | np.isnan(y))
+    labels = grid_dbscan(x, y, 20, 5)
+    assert (labels[~valid] == -1).all()
+    assert np.array_equal(labels[valid], grid_dbscan(x[valid], y[valid], 20, 5))
+    
+    return True
+
+def test_convoy_detection():
+    """Test convoy detection for vans booked together."""
+    print("\n🧪 Testing Convoy Detection...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    
+    convoys = processor.query_data('convoys', min_trips=2)
+    print(f"   Found {len(convoys)} convoys of 2+ vans")
+    
+    # Every convoy's size must match the number of trips carrying its ID
+    trips = processor.trip_data
+    sizes = trips.groupby('Convoy ID')['Trip ID'].size()
+    assert (trips['Convoy Size'] == trips['Convoy ID'].map(sizes)).all()
+    assert (convoys['Trips'] >= 2).all()
+    
+    # Points without coordinates or times pair with nothing; the rest pair as if they were absent
+    rng = np.random.default_rng(0)
+    x, y, t = rng.normal(0, 200, 300), rng.normal(0, 200, 300), rng.integers(0, 3600, 300)
+    x[::9] = np.nan
+    t[5::13] = np.iinfo(np.int64).min
+    valid = ~np.isnan(x) & (t != np.iinfo(np.int64).min)
+    i, j = spatiotemporal_pairs(x, y, t, 50, 600)
+    assert valid[i].all() and valid[j].all()
+    points = np.flatnonzero(valid)
+    expected_i, expected_j = spatiotemporal_pairs(x[valid], y[valid], t[valid], 50, 600)
+    assert sorted(zip(i, j)) == sorted(zip(points[expected_i], points[expected_j]))
+    
+    return True
+
+def test_cohort_retention():
+    """Test weekly cohort retention against a pandas groupby."""
+    print("\n🧪 Testing Cohort Retention...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    
+    retention = processor.query_data('cohort_retention', period='week', as_rate=False)
+    print(f"   Built {len(retention)} weekly cohorts")
+    
+    # Cohort sizes must add up to every checked-in rider, each counted once
+    checkins = processor.processed_data.dropna(subset=['User ID'])
+    first_week = checkins.groupby('User ID')['Trip Date and Time'].min().dt.to_period('W-SUN')
+    assert retention['Cohort Size'].sum() == checkins['User ID'].nunique()
+    assert (retention['Cohort Size'].to_numpy() == first_week.value_counts().sort_index().to_numpy()).all()
+    assert (retention[0] == retention['Cohort Size']).all()
+    
+    # Repeated queries hit the cache until the data is reprocessed
+    assert processor.query_data('cohort_retention', period='week', as_rate=False) is retention
+    
+    return True
+
+def test_chunk_store():
+    """Test that the compact chunk store round-trips texts and metadata."""
+    print("\n🧪 Testing Chunk Store...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    
+    trips = processor.trip_data
+    texts = ("Trip ID: " + trips['Trip ID'].astype(str)).to_numpy()
+    fields = {'trip_id': 'Trip ID', 'pickup_category': 'Pick Up Category', 'trip_date': 'Trip Date and Time', 'missing': 'No Such Column'}
+    store = ChunkStore.from_frame(trips, fields, texts)
+    print(f"   Stored {len(store)} chunks in {store.nbytes() / len(store):.0f} bytes each")
+    
+    row = len(trips) // 2
+    view = store.view(row, 0.5)
+    assert view['text'] == texts[row]
+    assert view['trip_id'] == trips['Trip ID'].iloc[row]
+    assert view['pickup_category'] == trips['Pick Up Category'].iloc[row]
+    assert view['trip_date'] == trips['Trip Date and Time'].iloc[row]
+    assert view['missing'] == '' and view['similarity_score'] == 0.5
+    assert store.texts() == list(texts)
+    
+    # Structured filters resolve to the same rows as pandas masks
+    category = trips['Pick Up Category'].iloc[row]
+    assert (store.equals('pickup_category', category) == (trips['Pick Up Category'] == category)).all()
+    start, end = trips['Trip Date and Time'].quantile([0.25, 0.75])
+    in_range = trips['Trip Date and Time'].between(start, end)
+    assert (store.between('trip_date', start, end) == in_range).all()
+    
+    return True
+
+def test_embedding_cache():
+    """Test that the embedding cache only encodes new, unique texts."""
+    print("\n🧪 Testing Embedding Cache...")
+    
+    encoded = []
+    def encoder(texts):
+        encoded.extend(texts)
+        return np.array([[len(text), text.count('a')] for text in texts], dtype=np.float32)
+    
+    with tempfile.TemporaryDirectory() as directory:
+        cache = EmbeddingCache(directory, 'test-model')
+        first = cache.encode(['alpha', 'beta', 'alpha'], encoder)
+        assert encoded == ['alpha', 'beta']
+        assert np.array_equal(first[0], first[2])
+        
+        # A fresh cache on the same directory reuses stored vectors, read on first use
+        cache = EmbeddingCache(directory, 'test-model')
+        assert not cache.loaded and cache.vectors is None
+        second = cache.encode(['beta', 'gamma', 'alpha'], encoder)
+        assert encoded == ['alpha', 'beta', 'gamma']
+        assert np.array_equal(second, encoder(['beta', 'gamma', 'alpha']))
+        
+        # Writers sharing a directory each add their own segment; a mismatched one is skipped
+        other = EmbeddingCache(directory, 'test-model')
+        other.encode(['delta'], encoder)
+        cache.encode(['epsilon'], encoder)
+        with open(os.path.join(directory, 'segment-bad.npz'), 'wb') as f:
+            np.savez(f, keys=text_keys('test-model', ['zeta', 'eta']), vectors=np.zeros((1, 2), dtype=np.float32))
+        fresh = EmbeddingCache(directory, 'test-model')
+        assert len(fresh) == 5 and len(fresh._segments()) == 5
+        assert fresh.lookup(text_keys('test-model', ['delta', 'epsilon', 'zeta']))[0].tolist() == [True, True, False]
+        
+        # The same text under another model is a different key
+        assert not cache.lookup(text_keys('other-model', ['alpha', 'beta']))[0].any()
+        
+        # Query cache: case/whitespace variants hit, the least recent entry is evicted
+        queries = QueryEmbeddingCache('test-model', max_size=2, path=os.path.join(directory, 'queries'))
+        queries.get('Age of  user 1', lambda q: encoder([q])[0])
+        queries.get('age of user 1', lambda q: encoder([q])[0])
+        queries.get('trip 2', lambda q: encoder([q])[0])
+        queries.get('trip 3', lambda q: encoder([q])[0])
+        assert (queries.hits, queries.misses) == (1, 3)
+        
+        # Entries are written in batches, as one file, and only reload for the same model
+        path = os.path.join(directory, 'queries')
+        assert not os.path.exists(path + '.npz')
+        queries.save()
+        assert list(QueryEmbeddingCache('test-model', path=path).entries) == ['trip 2', 'trip 3']
+        assert not QueryEmbeddingCache('other-model', path=path).entries
+        batched = QueryEmbeddingCache('test-model', path=path, save_every=2)
+        batched.get_many(['trip 4', 'trip 5'], lambda keys: encoder(keys))
+        assert len(QueryEmbeddingCache('test-model', path=path).entries) == 4
+        assert [name for name in os.listdir(directory) if name.startswith('queries')] == ['queries.npz']
+        
+        # A file whose queries and vectors disagree in length is rejected
+        with open(path + '.npz', 'wb') as f:
+            np.savez(f, model_name=np.array('test-model'), queries=np.array(['a', 'b']), vectors=np.zeros((1, 2)))
+        assert not QueryEmbeddingCache('test-model', path=path).entries
+    
+    return True
+
+def test_vector_indexes():
+    """Test the approximate vector indexes against exact search."""
+    print("\n🧪 Testing Vector Indexes...")
+    
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 32))
+    vectors = (centers[rng.integers(0, 20, 3000)] + 0.3 * rng.normal(size=(3000, 32))).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[:50]
+    
+    for index_type in ['flat', 'fp16', 'sq8', 'pq', 'hnsw', 'ivf', 'ivfpq']:
+        index, params = build_index(vectors, index_type)
+        recall = recall_at_k(index, vectors, queries, top_k=10)
+        print(f"   {index_type}: recall@10 = {recall:.3f} with {params}")
+        assert index.ntotal == len(vectors)
+        assert recall >= (0.9 if index_type in ('flat', 'fp16', 'sq8', 'hnsw') else 0.5)
+    
+    # HNSW and IVF-flat indexes hand back their stored rows exactly, so no copy is needed
+    for index_type in ['hnsw', 'ivf']:
+        stored = IndexVectors(build_index(vectors, index_type)[0])
+        assert stored.shape == vectors.shape and np.array_equal(stored[[3, 0, 2999]], vectors[[3, 0, 2999]])
+        assert np.array_equal(stored[10:20], vectors[10:20]) and np.array_equal(np.asarray(stored), vectors)
+    
+    # Scanning every IVF list is exact
+    index, params = build_index(vectors, 'ivf', {'nprobe': 10 ** 6})
+    assert recall_at_k(index, vectors, queries, top_k=10) == 1.0
+    
+    # Quantized storage shrinks vectors, and re-scoring PQ candidates restores ranking
+    stored = QuantizedVectors.from_float(vectors, 'int8')
+    assert stored.nbytes < vectors.nbytes / 3
+    assert np.abs(stored[:] - vectors).max() < 0.02
+    index, _ = build_index(vectors, 'pq')
+    _, candidates = index.search(queries[:1], 40)
+    ids, _ = rescore(stored, queries[0], candidates[0], 10)
+    assert ids[0] == 0
+    
+    return True
+
+def test_keyword_index():
+    """Test BM25 lookups of exact IDs and venue names, and rank fusion."""
+    print("\n🧪 Testing Keyword Index...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    
+    trips = processor.trip_data
+    texts = ("Trip ID: " + trips['Trip ID'].astype(str) + " | Dropoff: " + trips['Drop Off Address'].astype(str)).tolist()
+    index = BM25Index(texts)
+    print(f"   Indexed {len(index)} texts with {len(index.vocabulary)} terms")
+    
+    row = len(trips) // 3
+    docs, _ = index.search(f"details of trip {trips['Trip ID'].iloc[row]}", top_k=5)
+    assert docs[0] == row
+    
+    venue = trips['Drop Off Address'].iloc[row].split(',')[0]
+    docs, _ = index.search(venue, top_k=5)
+    assert venue.lower() in texts[docs[0]].lower()
+    
+    # Ids ranked well in both lists win the fusion
+    fused, _ = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], top_k=2)
+    assert fused == [1, 3]
+    
+    return True
+
+def test_encoder_backends():
+    """Test that ONNX exports agree with PyTorch."""
+    print("\n🧪 Testing Encoder Backends...")
+    
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer, models
+    
+    texts = ['Trip 734882 picked up at Moody Center', 'user 12 age 23', 'a group of 8 riders downtown on saturday night']
+    with tempfile.TemporaryDirectory() as directory:
+        # A tiny randomly initialized model stands in for MiniLM, so no download is needed
+        raw = os.path.join(directory, 'raw')
+        os.makedirs(raw)
+        words = ' '.join(texts).lower().split()
+        with open(os.path.join(raw, 'vocab.txt'), 'w') as f:
+            f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + sorted(set(words))))
+        tokenizer = BertTokenizerFast(os.path.join(raw, 'vocab.txt'))
+        tokenizer.save_pretrained(raw)
+        config = BertConfig(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2,
+                            num_attention_heads=2, intermediate_size=64)
+        BertModel(config).save_pretrained(raw)
+        model_dir = os.path.join(directory, 'model')
+        SentenceTransformer(modules=[models.Transformer(raw, max_seq_length=32), models.Pooling(32, 'mean'),
+                                     models.Normalize()]).save(model_dir)
+        
+        reference = create_encoder(model_dir, 'torch')
+        onnx_dir = os.path.join(directory, 'onnx')
+        for backend in ('onnx', 'onnx-int8'):
+            agreement = cosine_agreement(reference, create_encoder(model_dir, backend, threads=1, onnx_dir=onnx_dir), texts)
+            print(f"✅ {backend} cosine agreement: mean {agreement['mean']:.5f}, min {agreement['min']:.5f}")
+            assert agreement['min'] > 0.99
+    
+    # Quantized exports get their own cache keys
+    assert encoder_id('m', 'onnx') == 'm' and encoder_id('m', 'onnx-int8') != 'm'
+    
+    print("✅ ONNX exports match PyTorch")
+    
+    return True
+
+def test_hashing_encoder():
+    """Test the hashing encoder, which needs neither transformers nor a model download."""
+    print("\n🧪 Testing Hashing Encoder...")
+    
+    # Matching terms land in the same buckets
+    corpus = ['trip to moody center', 'trip to west campus', 'pickup downtown on saturday', 'user 12 age 23']
+    for params in ({}, {'n_features': 1024, 'svd_components': 3}):
+        encoder = create_encoder('unused', 'hashing', params=params).fit(corpus)
+        vectors = encoder.encode(corpus)
+        query = encoder.encode(['moody center trips'])[0]
+        assert vectors.shape == (4, encoder.dimension) and np.argmax(vectors @ query) == 0
+        with tempfile.TemporaryDirectory() as directory:
+            encoder.save(directory)
+            assert np.array_equal(HashingEncoder.load(directory).encode(corpus), vectors)
+    print("✅ Hashing encoder ranks matching texts first and round-trips")
+    
+    return True
+
+def test_query_service():
+    """Test that the query service batches concurrent searches without changing results."""
+    print("\n🧪 Testing Query Service...")
+    
+    rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing')
+    rag.load_and_process_data()
+    rag.create_data_chunks()
+    rag.create_embeddings()
+    
+    queries = ['trips to moody center', 'trip 729448', 'saturday night downtown', 'groups of 7 riders'] * 5
+    filters = [None, None, {'day': 'Saturday'}, None] * 5
+    expected = [[chunk['id'] for chunk in rag.search(q, 3, f)] for q, f in zip(queries, filters)]
+    
+    async def run():
+        async with QueryService(rag, max_wait_ms=20) as service:
+            results = await asyncio.gather(*(service.search(q, 3, f) for q, f in zip(queries, filters)))
+            return results, service.batches
+    
+    results, batches = asyncio.run(run())
+    assert [[chunk['id'] for chunk in result] for result in results] == expected
+    assert batches < len(queries)
+    print(f"✅ {len(queries)} concurrent queries answered in {batches} batches")
+    
+    return True
+
+def test_summary_chunks():
+    """Test that aggregate questions are answered from exact summary documents."""
+    print("\n🧪 Testing Summary Chunks...")
+    
+    # Named summaries must be found with a low-dimensional encoder too, where
+    # they may rank outside the top retrieval hits
+    for encoder_params in [None, {'svd_components': 64}]:
+        rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', encoder_params=encoder_params)
+        rag.load_and_process_data()
+        rag.create_data_chunks()
+        rag.create_embeddings()
+        data = rag.processed_data
+        
+        result = rag.answer_question("How many trips happen on Saturdays?")
+        assert result['route'] == 'summary'
+        assert f"Trips: {(data['DayOfWeek'] == 'Saturday').sum()}" in result['answer']
+        
+        result = rag.answer_question("How many late night trips are there?")
+        assert result['route'] == 'summary'
+        assert f"Trips: {data['Hour'].between(0, 5).sum()}" in result['answer']
+        
+        day = data['Trip Date and Time'].dt.strftime('%Y-%m-%d').value_counts().index[-1]
+        result = rag.answer_question(f"How many trips were there on {day}?")
+        assert result['route'] == 'summary'
+        assert f"Trips: {(data['Trip Date and Time'].dt.strftime('%Y-%m-%d') == day).sum()}" in result['answer']
+        
+        # Whole-dataset questions get the overall summary
+        for question in ["How many total trips are there?", "What is the busiest day overall?"]:
+            result = rag.answer_question(question)
+            assert result['route'] == 'summary' and "Summary of all Fetii trips" in result['answer']
+            assert f"Trips: {len(data)}\n" in result['answer']
+        
+        # Keys only match whole words, and one-word venues only when written as names
+        assert "Summary of trips to Rain" in rag.answer_question("How many trips go to Rain?")['answer']
+        for question in ["How many trips happen on rainy days?", "How many trips go to nightclubs?",
+                         "What's the average age of riders from Austin?", "How many trips in the rain?"]:
+            assert rag.answer_question(question)['route'] != 'summary', question
+        
+        # Questions spanning two summary dimensions are counted from the trips instead
+        result = rag.answer_question("How many trips on Saturday night?")
+        assert result['route'] == 'structured'
+        assert f"Total trips found: {((data['DayOfWeek'] == 'Saturday') & data['Hour'].between(18, 23)).sum()}\n" in result['answer']
+        print(f"✅ {len(rag.summary_chunks)} summary chunks answer aggregate questions exactly "
+              f"({rag.model.dimension} dimensions)")
+    
+    return True
+
+def test_structured_router():
+    """Test that structured questions are answered exactly from the chunk columns."""
+    print("\n🧪 Testing Structured Router...")
+    
+    rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing')
+    rag.load_and_process_data()
+    rag.create_data_chunks()
+    data = rag.processed_data
+    
+    def located(side, category):
+        address = 'Pick Up Address' if side == 'pickup' else 'Drop Off Address'
+        column = 'Pick Up Category' if side == 'pickup' else 'Drop Off Category'
+        return data[address].str.lower().str.contains(category.lower(), regex=False) | (data[column] == category)
+    
+    expected = {
+        "How many groups went to Moody Center?": located('dropoff', 'Moody Center').sum(),
+        "How many trips from downtown?": located('pickup', 'Downtown').sum(),
+        "How many pickups at the university?": located('pickup', 'University').sum(),
+        "How many trips start at the airport?": located('pickup', 'Airport').sum(),
+        "How many trips departed downtown?": located('pickup', 'Downtown').sum(),
+        "How many late night trips to downtown?": (located('dropoff', 'Downtown') & data['Hour'].between(0, 5)).sum(),
+        "How many trips to downtown on Saturday night?": (located('dropoff', 'Downtown') & data['Hour'].between(18, 23)
+                                                         & (data['DayOfWeek'] == 'Saturday')).sum()
+    }
+    for question, count in expected.items():
+        result = rag.answer_question(question)
+        assert result['route'] == 'structured'
+        assert f"Total trips found: {count}\n" in result['answer'], question
+    
+    # Relative periods, caller filters and age-only counts narrow the count too
+    dates = data['Trip Date and Time']
+    recent = dates >= dates.max() - pd.Timedelta(days=3)
+    counts = {
+        rag.answer_question("How many trips went to downtown in the last 3 days?")['answer']:
+            (located('dropoff', 'Downtown') & recent).sum(),
+        rag.answer_question("How many groups went to downtown?", filters={'day': 'Friday'})['answer']:
+            (located('dropoff', 'Downtown') & (data['DayOfWeek'] == 'Friday')).sum(),
+        rag.answer_question("How many riders are over 30?")['answer']: data['Age'].between(31, 200).sum(),
+        rag.answer_question("How many trips were there in the past 3 days?")['answer']: recent.sum()
+    }
+    for answer, count in counts.items():
+        assert f"Total trips found: {count}\n" in answer, answer
+    assert "Distinct riders booking" in rag.answer_question("How many riders are over 30?")['answer']
+    
+    # Without start or end wording the side is not guessed
+    assert rag.answer_question("How many trips at the airport?")['route'] != 'structured'
+    
+    assert rag._extract_filters("late night rides")['hours'] == (0, 5)
+    assert rag._extract_filters("saturday night rides")['hours'] == (18, 23)
+    
+    # Trip and user lookups
+    trip = data.iloc[0]
+    result = rag.answer_question(f"Tell me about trip {trip['Trip ID']}")
+    assert result['route'] == 'structured' and f"User ID {trip['User ID']}" in result['answer']
+    user_trips = (data['User ID'] == trip['User ID']).sum()
+    assert f"Total Trips: {user_trips}" in rag.answer_question(f"What is the age of user {trip['User ID']}?")['answer']
+    print(f"✅ {len(expected)} location counts match pandas")
+    
+    return True
+
+def test_query_service_stop():
+    """Test that stopping the query service cancels queries already taken into a batch."""
+    print("\n🧪 Testing Query Service Shutdown...")
+    
+    class SlowRAG:
+        def search_batch(self, queries, top_k, filters):
+            time.sleep(0.2)
+            return [[] for _ in queries]
+    
+    async def run(max_wait_ms):
+        service = QueryService(SlowRAG(), max_wait_ms=max_wait_ms)
+        tasks = [asyncio.create_task(service.search(f"query {i}")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        await service.stop()
+        done, pending = await asyncio.wait(tasks, timeout=1)
+        return pending, [task.cancelled() for task in done]
+    
+    # Stopped while the batch is still gathering, then while it is being searched
+    for max_wait_ms in (500, 1):
+        pending, cancelled = asyncio.run(run(max_wait_ms))
+        assert not pending and all(cancelled)
+    print("✅ In-flight queries are cancelled on stop")
+    
+    return True
+
+def test_user_profiles():
+    """Test that user profiles survive a saved RAG system and unknown users are reported."""
+    print("\n🧪 Testing User Profiles...")
+    
+    rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing')
+    rag.load_and_process_data()
+    rag.create_data_chunks()
+    rag.create_embeddings()
+    users = rag.processed_data['User ID'].value_counts().index[:20]
+    
+    # A loaded system has no history index and must rebuild the same profile from chunks
+    with tempfile.TemporaryDirectory() as directory:
+        rag.save_system(directory)
+        loaded = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing')
+        loaded.load_system(directory)
+        for user_id in users:
+            question = f"What is the age of user {user_id}?"
+            assert loaded.answer_question(question)['answer'] == rag.answer_question(question)['answer']
+    
+    from streamlit_app import FetiiChatbot
+    chatbot = FetiiChatbot()
+    assert chatbot.analyze_query("age of user 99999999")['summary'] == "No data found for User ID 99999999"
+    assert chatbot.analyze_query(f"age of user {users[0]}")['summary'] == f"Found information for User ID {users[0]}"
+    print(f"✅ {len(users)} profiles match after reload")
+    
+    # A missing address must not count towards the previous user's most frequent value
+    trips = pd.DataFrame({
+        'Trip ID': [1, 2, 3, 4, 5],
+        'Trip Date and Time': pd.to_datetime(['2025-09-01', '2025-09-02', '2025-09-03', '2025-09-04', '2025-09-05']),
+        'Pick Up Address Clean': ['Rainey St', 'Zilker Park', np.nan, np.nan, np.nan],
+    })
+    history = UserHistoryIndex([1, 1, 2, 2, 3], trips, [0, 1, 2, 3, 4],
+                               profile_columns={'Top Pickup': 'Pick Up Address Clean'})
+    assert history.profile(1)['Top Pickup'] == 'Zilker Park'
+    assert pd.isna(history.profile(2)['Top Pickup']) and pd.isna(history.profile(3)['Top Pickup'])
+    print("✅ Missing addresses are left out of most frequent values")
+    
+    return True
+
+def test_tile_pyramid():
+    """Test the density tile pyramid against direct per-zoom binning."""
+    print("\n🧪 Testing Tile Pyramid...")
+    
+    rng = np.random.default_rng(0)
+    lat = 30.27 + rng.normal(0, 0.05, 500)
+    lon = -97.74 + rng.normal(0, 0.05, 500)
+    lat[:5] = np.nan
+    weights = rng.integers(1, 15, 500)
+    pyramid = TilePyramid(lat, lon, weights, min_zoom=8, max_zoom=16)
+    
+    valid = ~np.isnan(lat)
+    for zoom in range(8, 17):
+        cells = pyramid.cells(zoom)
+        scale = 2 ** (zoom + pyramid.bin_bits)
+        mx, my = _to_mercator(lat[valid], lon[valid])
+        expected = pd.DataFrame({'x': (mx * scale).astype(np.int64), 'y': (my * scale).astype(np.int64),
+                                 'w': weights[valid]}).groupby(['x', 'y'])['w'].agg(['size', 'sum'])
+        assert len(cells) == len(expected)
+        assert cells['Trips'].sum() == valid.sum() and cells['Total Passengers'].sum() == weights[valid].sum()
+        assert sorted(cells['Trips']) == sorted(expected['size'])
+    
+    # Clipping keeps exactly the cells whose centres fall inside the viewport
+    bounds = viewport_bounds(30.27, -97.74, 14)
+    south, west, north, east = bounds
+    assert south < 30.27 < north and west < -97.74 < east
+    clipped, cells = pyramid.cells(14, bounds), pyramid.cells(14)
+    inside = cells['Latitude'].between(south, north) & cells['Longitude'].between(west, east)
+    assert 0 < len(clipped) < len(cells)
+    assert len(clipped) >= inside.sum()
+    
+    # Close zooms send a view's worth of cells instead of the whole city
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    full = processor.get_density_cells('pickup', 16)
+    view = processor.get_density_cells('pickup', 16, center=(30.2672, -97.7431))
+    assert len(view) < len(full) / 4
+    print(f"✅ Pyramid matches direct binning; zoom 16 view sends {len(view)} of {len(full)} cells")
+    
+    return True
+
+def test_quantized_storage():
+    """Test that quantized vector storage replaces, not duplicates, the flat index."""
+    print("\n🧪 Testing Quantized Storage...")
+    
+    for storage, index_type in [('float16', 'fp16'), ('int8', 'sq8')]:
+        rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None,
+                             vector_storage=storage, rescore_factor=4, encoder_params={'svd_components': 64})
+        assert rag.index_type == index_type
+        rag.load_and_process_data()
+        rag.create_data_chunks()
+        rag.create_embeddings()
+        assert isinstance(rag.embeddings, QuantizedVectors) and rag.embeddings.storage == storage
+        expected = [chunk['id'] for chunk in rag.search("trips to Moody Center on Saturday", 5)]
+        
+        # The rescore factor is restored from the manifest, not the constructor
+        with tempfile.TemporaryDirectory() as directory:
+            rag.save_system(directory)
+            loaded = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+            assert loaded.load_system(directory)
+            assert (loaded.index_type, loaded.vector_storage, loaded.rescore_factor) == (index_type, storage, 4)
+            assert [chunk['id'] for chunk in loaded.search("trips to Moody Center on Saturday", 5)] == expected
+    print("✅ float16 and int8 storage pair with fp16 and sq8 scans and reload with their rescore factor")
+    
+    return True
+
+def test_save_load():
+    """Test that a saved system reloads with the same chunks, indexes and answers."""
+    print("\n🧪 Testing Save and Load...")
+    
+    questions = ["trips to Moody Center on Saturday", "large groups downtown late night", "How many trips happen on Fridays?"]
+    for index_type, storage in [('flat', 'float32'), ('hnsw', 'float32'), ('ivfpq', 'int8'), ('fp16', 'float16'), ('pq', 'float32')]:
+        rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None,
+                             index_type=index_type, vector_storage=storage, rescore_factor=2,
+                             encoder_params={'svd_components': 64})
+        rag.load_and_process_data()
+        rag.create_data_chunks()
+        rag.create_embeddings()
+        
+        with tempfile.TemporaryDirectory() as directory:
+            rag.save_system(directory)
+            loaded = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+            assert loaded.load_system(directory)
+            
+            # Chunks, keyword index, summaries and stored vectors
+            assert loaded.data_chunks.texts() == rag.data_chunks.texts()
+            # Full source rows (raw_data) are never persisted
+            for row in (0, 999):
+                chunk = {key: value for key, value in rag.data_chunks.view(row).items() if key != 'raw_data'}
+                assert dict(loaded.data_chunks.view(row)) == chunk
+            assert np.array_equal(loaded.text_index.search(questions[0], 10)[0], rag.text_index.search(questions[0], 10)[0])
+            assert loaded.summary_chunks.texts() == rag.summary_chunks.texts()
+            assert np.array_equal(loaded.summary_embeddings, rag.summary_embeddings)
+            assert isinstance(loaded.embeddings, QuantizedVectors) == (storage != 'float32')
+            if index_type == 'hnsw':
+                assert isinstance(rag.embeddings, IndexVectors)
+            assert np.array_equal(np.asarray(loaded.embeddings), np.asarray(rag.embeddings))
+            
+            # The manifest's index type and parameters win over the constructor's
+            assert (loaded.index_type, loaded.index_params) == (index_type, rag.index_params)
+            assert loaded.vector_storage == storage and loaded.rescore_factor == 2
+            assert loaded.index.ntotal == rag.index.ntotal
+            for question in questions:
+                assert [chunk['id'] for chunk in loaded.search(question, 5)] == [chunk['id'] for chunk in rag.search(question, 5)]
+                assert loaded.answer_question(question)['answer'] == rag.answer_question(question)['answer']
+        print(f"   {index_type} index with {storage} vectors round-trips")
+    
+    # Saving over a live system swaps in a complete new directory; the loaded copy keeps its files
+    with tempfile.TemporaryDirectory() as parent:
+        directory = os.path.join(parent, 'system')
+        rag.save_system(directory)
+        live = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+        assert live.load_system(directory)
+        expected = [chunk['id'] for chunk in live.search(questions[0], 5)]
+        rebuilt = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None,
+                                 index_type='hnsw', encoder_params={'svd_components': 64})
+        rebuilt.load_and_process_data()
+        rebuilt.create_data_chunks()
+        rebuilt.create_embeddings()
+        rebuilt.save_system(directory)
+        assert os.listdir(parent) == ['system']
+        assert [chunk['id'] for chunk in live.search(questions[0], 5)] == expected
+        reloaded = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+        assert reloaded.load_system(directory) and reloaded.index_type == 'hnsw'
+    print("✅ Saved systems reload with identical chunks, indexes and answers")
+    
+    return True
+
+def test_interval_tree():
+    """Test interval tree stabbing and overlap queries against brute force."""
+    print("\n🧪 Testing Interval Tree...")
+    
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, 1000, 300)
+    ends = starts + rng.integers(0, 60, 300)
+    tree = IntervalTree(starts, ends)
+    points = np.concatenate([rng.integers(-10, 1070, 500), starts[:20], ends[:20]])
+    
+    point_ids, interval_ids = tree.stab(points)
+    found = sorted(zip(point_ids.tolist(), interval_ids.tolist()))
+    contains = (starts[None, :] <= points[:, None]) & (points[:, None] <= ends[None, :])
+    assert found == sorted(zip(*[ids.tolist() for ids in np.nonzero(contains)]))
+    
+    for start, end in [(100, 150), (0, 0), (990, 2000), (-50, -1)]:
+        assert np.array_equal(tree.overlap(start, end), np.flatnonzero((starts <= end) & (ends >= start)))
+    
+    # An empty tree stabs nothing
+    assert len(IntervalTree([], []).stab(points)[0]) == 0
+    print(f"✅ {len(found)} stabbing matches agree with brute force")
+    
+    # Drop-offs without an address form no event window of their own
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    trips = processor.trip_data
+    unknown = trips.index[:5]
+    trips.loc[unknown, 'Drop Off Address Clean'] = np.nan
+    trips.loc[unknown, 'Trip Date and Time'] = pd.Timestamp('2030-01-01') + pd.to_timedelta(np.arange(5), unit='min')
+    processor._event_cache.clear()
+    windows = processor.detect_event_windows()
+    assert (windows['Start'] < pd.Timestamp('2030-01-01')).all()
+    assert windows['Venue'].notna().all()
+    print(f"✅ {len(windows)} event windows ignore drop-offs without a venue")
+    
+    return True
+
+def test_wide_view():
+    """Test that the schema's wide view matches merging the three sheets."""
+    print("\n🧪 Testing Wide View...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    trips, checkins, users = processor.trip_data, processor.rider_data, processor.demo_data
+    schema = processor.schema
+    
+    # The view the schema replaced: left-merge trips with check-ins, then demographics
+    merged = trips.merge(checkins, on='Trip ID', how='left').merge(
+        users.drop_duplicates('User ID'), on='User ID', how='left')
+    wide = schema.wide_view()
+    assert len(wide) == len(merged)
+    pd.testing.assert_frame_equal(wide[merged.columns], merged, check_dtype=False)
+    
+    # A trip subset keeps the same rows for those trips
+    mask = trips['Total Passengers'] >= 10
+    subset = merged[merged['Trip ID'].isin(trips.loc[mask, 'Trip ID'])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(schema.wide_view(mask)[merged.columns], subset, check_dtype=False)
+    print(f"✅ Wide view matches the merged sheets ({len(wide)} rows)")
+    
+    return True
+
+def test_corider_graph():
+    """Test companions, friend groups and trip cohesion on a hand-built bridge."""
+    print("\n🧪 Testing Co-Rider Graph...")
+    
+    # Riders 1 and 2 share three trips; 3 and 4 each ride with them once; trip 15 has no check-ins
+    trips = pd.DataFrame({'Trip ID': [11, 12, 13, 14, 15]})
+    checkins = pd.DataFrame({'Trip ID': [11, 11, 11, 12, 12, 13, 13, 13, 14],
+                             'User ID': [1, 2, 3, 1, 2, 1, 2, 4, 3]})
+    users = pd.DataFrame({'User ID': [1, 2, 3, 4], 'Age': [21, 22, 23, 24]})
+    graph = CoRiderGraph(TripSchema(trips, checkins, users))
+    
+    assert graph.trip_counts.tolist() == [3, 3, 2, 1]
+    companions = graph.companions(1)
+    assert companions['User ID'].tolist() == [2, 3, 4]
+    assert companions['Shared Trips'].tolist() == [3, 1, 1]
+    assert graph.companions(4)['User ID'].tolist() == [1, 2]
+    assert graph.companions(99).empty
+    
+    groups = graph.friend_groups(min_shared_trips=2, min_size=2)
+    assert len(groups) == 1 and sorted(groups['Members'][0]) == [1, 2] and groups['Trips'][0] == 6
+    
+    # Ordered rider pairs that also share another trip: 1-2 and 2-1
+    cohesion = graph.trip_cohesion(min_shared_trips=2)
+    assert np.allclose(cohesion[:3], [2 / 6, 2 / 2, 2 / 6])
+    assert np.isnan(cohesion[3:]).all()
+    print("✅ Co-rider graph matches the hand-counted shared trips")
+    
+    return True
+
+def test_rider_similarity():
+    """Test sparse rider similarity against dense cosine similarity."""
+    print("\n🧪 Testing Rider Similarity...")
+    
+    processor = FetiiDataProcessor('FetiiAI_Data_Austin.xlsx')
+    processor.load_data()
+    processor.process_data()
+    similarity = processor.get_rider_similarity()
+    
+    dense = similarity.vectors.toarray()
+    norms = np.linalg.norm(dense, axis=1)
+    user_ids = similarity.schema.users['User ID'].to_numpy()
+    riders = np.flatnonzero(norms > 0)
+    batch = similarity.similar_batch(top_k=10)
+    for position in riders[::len(riders) // 20][:20]:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cosine = np.nan_to_num(dense @ dense[position] / (norms * norms[position]))
+        cosine[position] = -1
+        expected = np.sort(cosine[cosine > 0])[::-1][:10]
+        
+        similar = similarity.similar(user_ids[position], top_k=10)
+        assert np.allclose(similar['Similarity'], np.round(expected, 4))
+        found = similarity.schema.user_index.get_indexer(similar['User ID'])
+        assert np.allclose(cosine[found], expected)
+        
+        rows = batch[batch['User ID'] == user_ids[position]]
+        assert np.allclose(rows['Similarity'][:len(expected)], np.round(expected, 4))
+    print(f"✅ Similar riders match dense cosine scores for {min(20, len(riders))} riders")
+    
+    # A tiny memory budget only shrinks the blocks, never changes the answer
+    small = similarity.similar_batch(top_k=10, memory_budget=48 * len(user_ids) * 7)
+    pd.testing.assert_frame_equal(small, batch)
+    assert (batch['Similarity'] > 0).all()
+    assert (batch['User ID'] != batch['Similar User ID']).all()
+    print("✅ Batch similarity is independent of block size and skips zero scores")
+    
+    return True
+
+def test_load_memory():
+    """Test that loading a saved system maps its index instead of copying it."""
+    print("\n🧪 Testing Load Memory...")
+    
+    def anonymous_rss():
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith('RssAnon'))
+    
+    if not os.path.exists('/proc/self/status'):
+        print("⚠️ /proc not available, skipping")
+        return True
+    
+    rag = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+    rag.load_and_process_data()
+    rag.create_data_chunks()
+    rag.create_embeddings()
+    index_bytes = rag.index.ntotal * rag.index.d * 4
+    
+    with tempfile.TemporaryDirectory() as directory:
+        rag.save_system(directory)
+        del rag
+        loaded = FetiiRAGSystem('FetiiAI_Data_Austin.xlsx', encoder_backend='hashing', embedding_cache_dir=None)
+        before = anonymous_rss()
+        assert loaded.load_system(directory)
+        grown = anonymous_rss() - before
+        
+        # Private memory grows by far less than the index, whose pages stay shared with the file
+        assert grown < index_bytes / 2, f"{grown >> 20} MB private for a {index_bytes >> 20} MB index"
+        assert loaded.search("trips to Moody Center", 5)
+        print(f"✅ Loading a {index_bytes >> 20} MB flat index grew private memory by {grown >> 20} MB")
+        del loaded
+    
+    return True
+
 def test_chatbot_integration():
     """Test the chatbot integration."""
     print("\n🧪 Testing Chatbot Integration...")
@@ -128,7 +931,73 @@ def main():
         # Test 2: Specific Queries
         test_specific_queries()
         
-        # Test 3: Chatbot Integration
+        # Test 3: Hot Spot Queries
+        test_hotspot_queries()
+        
+        # Test 4: Convoy Detection
+        test_convoy_detection()
+        
+        # Test 5: Cohort Retention
+        test_cohort_retention()
+        
+        # Test 6: Chunk Store
+        test_chunk_store()
+        
+        # Test 7: Embedding Cache
+        test_embedding_cache()
+        
+        # Test 8: Vector Indexes
+        test_vector_indexes()
+        
+        # Test 9: Keyword Index
+        test_keyword_index()
+        
+        # Test 10: Encoder Backends
+        test_encoder_backends()
+        
+        # Test 11: Hashing Encoder
+        test_hashing_encoder()
+        
+        # Test 12: Query Service
+        test_query_service()
+        
+        # Test 13: Summary Chunks
+        test_summary_chunks()
+        
+        # Test 14: Structured Router
+        test_structured_router()
+        
+        # Test 15: Query Service Shutdown
+        test_query_service_stop()
+        
+        # Test 16: User Profiles
+        test_user_profiles()
+        
+        # Test 17: Tile Pyramid
+        test_tile_pyramid()
+        
+        # Test 18: Quantized Storage
+        test_quantized_storage()
+        
+        # Test 19: Save and Load
+        test_save_load()
+        
+        # Test 20: Interval Tree
+        test_interval_tree()
+        
+        # Test 21: Wide View
+        test_wide_view()
+        
+        # Test 22: Co-Rider Graph
+        test_corider_graph()
+        
+        # Test 23: Rider Similarity
+        test_rider_similarity()
+        
+        # Test 24: Load Memory
+        test_load_memory()
+        
+        # Test 25: Chatbot Integration
         test_chatbot_integration()
         
         print("\n✅ All tests completed successfully!")
@@ -0,0 +1,112 @@
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text):
+    """Lower-case word and number tokens, keeping IDs like 734882 whole."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Index:
+    def __init__(self, texts, k1=1.2, b=0.75):
+        """Sparse BM25 inverted index over chunk texts.
+
+        Postings are stored per term in CSC form with their BM25 weight already
+        computed, so a query only sums the posting lists of its terms: an ID
+        lookup is a single short list probe.
+        """
+        self.k1, self.b = k1, b
+        tokens = [tokenize(text) for text in texts]
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        docs = np.repeat(np.arange(len(tokens)), lengths)
+        term_codes, vocabulary = pd.factorize(pd.Series([t for doc in tokens for t in doc], dtype=object))
+
+        counts = sparse.csc_matrix(
+            (np.ones(len(docs), dtype=np.float32), (docs, term_codes)),
+            shape=(len(tokens), len(vocabulary))
+        )
+        counts.sum_duplicates()
+        self._set_weights(counts, lengths, list(vocabulary))
+
+    def _set_weights(self, counts, lengths, vocabulary):
+        """Turn raw term counts into BM25 posting weights."""
+        n_docs = counts.shape[0]
+        document_frequency = np.diff(counts.indptr)
+        idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if n_docs else 0.0
+
+        tf = counts.data
+        norm = self.k1 * (1 - self.b + self.b * lengths[counts.indices] / max(average_length, 1e-9))
+        term_of_posting = np.repeat(np.arange(counts.shape[1]), document_frequency)
+        weights = counts.copy()
+        weights.data = (idf[term_of_posting] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+        self.postings = weights
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+
+    def __len__(self):
+        return self.postings.shape[0]
+
+    def score(self, query):
+        """Return (doc ids, BM25 scores) of every doc matching a query term."""
+        terms = [self.term_ids[t] for t in set(tokenize(query)) if t in self.term_ids]
+        if not terms:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+
+        indptr, indices, data = self.postings.indptr, self.postings.indices, self.postings.data
+        docs = np.concatenate([indices[indptr[t]:indptr[t + 1]] for t in terms])
+        weights = np.concatenate([data[indptr[t]:indptr[t + 1]] for t in terms])
+        docs, inverse = np.unique(docs, return_inverse=True)
+        return docs, np.bincount(inverse, weights=weights).astype(np.float32)
+
+    def search(self, query, top_k=10, allowed=None):
+        """Return the ``top_k`` best (doc ids, scores), optionally within a boolean doc mask."""
+        docs, scores = self.score(query)
+        if allowed is not None:
+            keep = allowed[docs]
+            docs, scores = docs[keep], scores[keep]
+        if len(docs) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((docs, -scores))
+        return docs[order], scores[order]
+
+    def save(self, directory):
+        """Write postings as ``.npy`` arrays and the vocabulary as JSON."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ('indptr', 'indices', 'data'):
+            np.save(os.path.join(directory, f'{name}.npy'), getattr(self.postings, name))
+        with open(os.path.join(directory, 'vocabulary.json'), 'w') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'n_docs': self.postings.shape[0], 'terms': self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, directory):
+        """Map saved postings read-only."""
+        with open(os.path.join(directory, 'vocabulary.json')) as f:
+            manifest = json.load(f)
+
+        index = cls.__new__(cls)
+        index.k1, index.b = manifest['k1'], manifest['b']
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in ('data', 'indices', 'indptr')]
+        index.postings = sparse.csc_matrix(tuple(arrays), shape=(manifest['n_docs'], len(manifest['terms'])))
+        index.vocabulary = manifest['terms']
+        index.term_ids = {term: i for i, term in enumerate(index.vocabulary)}
+        return index
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=60):
+    """Fuse ranked id lists: each id scores sum(1 / (k + rank)) over the lists."""
+    fused = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            fused[int(doc)] = fused.get(int(doc), 0.0) + 1.0 / (k + rank + 1)
+    ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    return [doc for doc, _ in ranked], [score for _, score in ranked]
@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+
+
+class TripSchema:
+    def __init__(self, trips, checkins, users):
+        """Build a normalized star schema from the three Fetii sheets.
+
+        - ``trips``: fact table, one row per trip (kept as-is, not copied)
+        - ``users``: dimension table, one row per user seen in check-ins or demographics
+        - check-in bridge: CSR arrays where ``rider_positions[offsets[t]:offsets[t + 1]]``
+          are the user-dimension rows of the riders checked in on trip ``t``
+
+        Trip-level questions scan ``trips`` directly; a wide trip x rider frame is
+        only materialized by ``wide_view`` when a query needs rider columns.
+        """
+        self.trips = trips
+
+        # Users dimension: every checked-in user, with demographics where known
+        demographics = users.drop_duplicates('User ID').set_index('User ID')
+        user_ids = pd.Index(checkins['User ID']).append(demographics.index).unique()
+        self.users = demographics.reindex(user_ids).reset_index()
+        self.users = self.users.rename(columns={'index': 'User ID'})
+        self.user_index = pd.Index(self.users['User ID'])
+
+        # Check-in bridge in CSR form, keeping trip order and check-in order
+        trip_positions = pd.Index(trips['Trip ID']).get_indexer(checkins['Trip ID'])
+        known = trip_positions >= 0
+        trip_positions = trip_positions[known]
+        user_positions = self.user_index.get_indexer(checkins['User ID'].values[known])
+
+        order = np.argsort(trip_positions, kind='stable')
+        self.rider_positions = user_positions[order].astype(np.int32)
+        self.offsets = np.zeros(len(trips) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(trip_positions, minlength=len(trips)), out=self.offsets[1:])
+
+    @property
+    def rider_counts(self):
+        """Number of checked-in riders per trip."""
+        return np.diff(self.offsets)
+
+    @property
+    def checkin_trips(self):
+        """Trip position of every check-in in the bridge."""
+        return np.repeat(np.arange(len(self.trips)), self.rider_counts)
+
+    def riders_of(self, trip_position):
+        """Return the user-dimension rows of the riders on one trip."""
+        return self.rider_positions[self.offsets[trip_position]:self.offsets[trip_position + 1]]
+
+    def _row_layout(self, trip_positions):
+        """Lay out wide-view rows: one per check-in, or one per trip without check-ins."""
+        counts = self.rider_counts[trip_positions]
+        rows_per_trip = np.maximum(counts, 1)
+        row_trips = np.repeat(trip_positions, rows_per_trip)
+
+        # Position of each row within its trip's run, used to index the bridge
+        run_starts = np.repeat(np.cumsum(rows_per_trip) - rows_per_trip, rows_per_trip)
+        within = np.arange(len(row_trips)) - run_starts
+        has_rider = np.repeat(counts > 0, rows_per_trip)
+
+        row_users = np.full(len(row_trips), -1, dtype=np.int64)
+        row_users[has_rider] = self.rider_positions[self.offsets[row_trips[has_rider]] + within[has_rider]]
+        return row_trips, row_users
+
+    def user_values(self, column, row_users):
+        """Look up a users-dimension column for wide-view rows (NaN where no rider)."""
+        values = self.users[column].to_numpy()
+        result = pd.Series(values[np.maximum(row_users, 0)], dtype=self.users[column].dtype)
+        if (row_users < 0).any():
+            result = result.where(row_users >= 0)
+        return result.to_numpy()
+
+    def wide_view(self, trip_mask=None):
+        """Materialize the trip x rider frame, optionally for a subset of trips.
+
+        Produces the same rows as left-merging trips with check-ins and then with
+        demographics: one row per checked-in rider, in trip order.
+        """
+        trip_positions = np.arange(len(self.trips))
+        if trip_mask is not None:
+            trip_positions = trip_positions[np.asarray(trip_mask, dtype=bool)]
+
+        row_trips, row_users = self._row_layout(trip_positions)
+        wide = self.trips.iloc[row_trips].reset_index(drop=True)
+        for column in self.users.columns:
+            wide[column] = self.user_values(column, row_users)
+        return wide
+
+    def user_row(self, user_id):
+        """Return the users-dimension row of one user, or None if unknown."""
+        if user_id not in self.user_index:
+            return None
+        return self.users.iloc[self.user_index.get_loc(user_id)]
+
+    def rider_level_counts(self, trip_column=None, user_column=None, fill="Unknown"):
+        """Count wide-view rows per value of one column without materializing the view."""
+        if trip_column is not None:
+            rows_per_trip = np.maximum(self.rider_counts, 1)
+            counts = pd.Series(rows_per_trip).groupby(self.trips[trip_column].to_numpy()).sum()
+            return counts.sort_values(ascending=False)
+
+        _, row_users = self._row_layout(np.arange(len(self.trips)))
+        values = pd.Series(self.user_values(user_column, row_users)).fillna(fill)
+        return values.value_counts()
+
+    def trip_rider_aggregates(self, categories, age_column='Age', group_column='Age Group'):
+        """Aggregate rider demographics per trip in one pass over the bridge.
+
+        Returns a frame aligned with ``trips`` holding rider counts, age
+        statistics and per-category rider counts as compact numeric columns.
+        """
+        n_trips = len(self.trips)
+        counts = self.rider_counts
+        checkin_trips = self.checkin_trips
+        ages = self.users[age_column].to_numpy(dtype=float)[self.rider_positions]
+        known = ~np.isnan(ages)
+
+        known_counts = np.bincount(checkin_trips[known], minlength=n_trips)
+        age_sums = np.bincount(checkin_trips[known], weights=ages[known], minlength=n_trips)
+
+        # Check-ins are contiguous per trip, so min/max reduce over CSR segments
+        min_ages = np.full(n_trips, np.nan)
+        max_ages = np.full(n_trips, np.nan)
+        has_riders = counts > 0
+        if has_riders.any():
+            segment_starts = self.offsets[:-1][has_riders]
+            min_ages[has_riders] = np.fmin.reduceat(ages, segment_starts)
+            max_ages[has_riders] = np.fmax.reduceat(ages, segment_starts)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            aggregates = pd.DataFrame({
+                'Checked In Riders': counts.astype(np.int16),
+                'Check-in Ratio': (counts / self.trips['Total Passengers'].to_numpy()).astype(np.float32),
+                'Demographic Coverage': np.where(has_riders, known_counts / counts, np.nan).astype(np.float32),
+                'Mean Rider Age': np.where(known_counts > 0, age_sums / known_counts, np.nan).astype(np.float32),
+                'Min Rider Age': min_ages.astype(np.float32),
+                'Max Rider Age': max_ages.astype(np.float32),
+            }, index=self.trips.index)
+
+        groups = self.users[group_column].to_numpy()[self.rider_positions]
+        for category in categories:
+            in_category = groups == category
+            aggregates[f'Riders {category}'] = np.bincount(
+                checkin_trips[in_category], minlength=n_trips
+            ).astype(np.int16)
+
+        return aggregates
+
+
+class UserHistoryIndex:
+    def __init__(self, user_ids, trips, trip_positions, time_column='Trip Date and Time',
+                 profile_columns=None):
+        """Index each user's trips sorted by time, with precomputed profile stats.
+
+        ``user_ids`` and ``trip_positions`` describe one record per (user, trip)
+        pair. Records are sorted once by user then time and stored in CSR form:
+        ``trip_positions[offsets[u]:offsets[u + 1]]`` is user ``u``'s history,
+        oldest first. ``profile_columns`` maps profile names to trip columns whose
+        most frequent value per user is precomputed (e.g. top pickup).
+        """
+        self.trips = trips
+        user_ids = np.asarray(user_ids)
+        trip_positions = np.asarray(trip_positions, dtype=np.int64)
+
+        valid = ~pd.isna(user_ids)
+        user_ids, trip_positions = user_ids[valid], trip_positions[valid]
+        user_codes, unique_users = pd.factorize(user_ids)
+        self.user_index = pd.Index(unique_users)
+
+        times = trips[time_column].to_numpy()[trip_positions]
+        order = np.lexsort((times, user_codes))
+        self.trip_positions = trip_positions[order]
+        sorted_codes = user_codes[order]
+
+        self.offsets = np.zeros(len(unique_users) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sorted_codes, minlength=len(unique_users)), out=self.offsets[1:])
+
+        # Per-user profile: counts and first/latest trips come straight from the CSR ends
+        first = self.trip_positions[self.offsets[:-1]]
+        latest = self.trip_positions[self.offsets[1:] - 1]
+        self.profiles = pd.DataFrame({
+            'Trip Count': np.diff(self.offsets),
+            'First Seen': trips[time_column].to_numpy()[first],
+            'Latest Trip': trips[time_column].to_numpy()[latest],
+            'Latest Trip ID': trips['Trip ID'].to_numpy()[latest],
+        }, index=self.user_index)
+
+        for name, column in (profile_columns or {}).items():
+            self.profiles[name] = self._most_frequent(trips[column].to_numpy()[self.trip_positions], sorted_codes)
+
+    def _most_frequent(self, values, sorted_codes):
+        """Return the most frequent value per user (the most recent one on ties)."""
+        value_codes, uniques = pd.factorize(values)
+        top = np.empty(len(self.user_index), dtype=object)
+
+        # Missing values get code -1, which would alias the previous user's last value
+        known = value_codes >= 0
+        if not known.any():
+            return top
+        value_codes, sorted_codes = value_codes[known], sorted_codes[known]
+        n_values = len(uniques)
+        pair_keys = sorted_codes.astype(np.int64) * n_values + value_codes
+        keys, inverse, counts = np.unique(pair_keys, return_inverse=True, return_counts=True)
+
+        # Latest occurrence of each (user, value) pair breaks ties towards recent trips
+        latest = np.zeros(len(keys), dtype=np.int64)
+        np.maximum.at(latest, inverse, np.arange(len(pair_keys)))
+
+        users = keys // n_values
+        best = np.lexsort((latest, counts, users))
+        last_per_user = np.flatnonzero(np.r_[users[best][1:] != users[best][:-1], True])
+        top[users[best][last_per_user]] = np.asarray(uniques, dtype=object)[keys[best][last_per_user] % n_values]
+        return top
+
+    def __contains__(self, user_id):
+        return user_id in self.user_index
+
+    def profile(self, user_id):
+        """Return the precomputed profile of one user as a dict, or None if unknown."""
+        if user_id not in self.user_index:
+            return None
+        return self.profiles.iloc[self.user_index.get_loc(user_id)].to_dict()
+
+    def history(self, user_id, latest_first=True):
+        """Return the user's trips sorted by time."""
+        if user_id not in self.user_index:
+            return self.trips.iloc[[]]
+        position = self.user_index.get_loc(user_id)
+        trip_positions = self.trip_positions[self.offsets[position]:self.offsets[position + 1]]
+        if latest_first:
+            trip_positions = trip_positions[::-1]
+        return self.trips.iloc[trip_positions]
@@ -0,0 +1,228 @@
+import faiss
+import numpy as np
+
+INDEX_TYPES = ('flat', 'fp16', 'sq8', 'pq', 'hnsw', 'ivf', 'ivfpq')
+VECTOR_STORAGES = ('float32', 'float16', 'int8')
+
+# Defaults per index type; None values are sized from the data in resolve_params
+DEFAULT_PARAMS = {
+    'flat': {},
+    'fp16': {},
+    'sq8': {},
+    'pq': {'pq_m': None, 'pq_bits': 8},
+    'hnsw': {'M': 32, 'ef_construction': 200, 'ef_search': 64},
+    'ivf': {'nlist': None, 'nprobe': 8},
+    'ivfpq': {'nlist': None, 'nprobe': 8, 'pq_m': None, 'pq_bits': 8},
+}
+
+
+def resolve_params(index_type, params, n_vectors, dimension):
+    """Fill in index parameters that were not given, sized for the data."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+    resolved = dict(DEFAULT_PARAMS[index_type])
+    resolved.update(params or {})
+
+    # About 4 * sqrt(n) lists, with at least 39 training points per list
+    if 'nlist' in resolved and resolved['nlist'] is None:
+        resolved['nlist'] = int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // 39)))
+
+    # Largest sub-quantizer count up to 48 that divides the dimension
+    if 'pq_m' in resolved and resolved['pq_m'] is None:
+        resolved['pq_m'] = max(m for m in range(1, min(dimension, 48) + 1) if dimension % m == 0)
+
+    # Each of the 2^bits PQ centroids needs about 39 training points
+    if 'pq_bits' in resolved:
+        resolved['pq_bits'] = int(max(1, min(resolved['pq_bits'], np.log2(max(n_vectors // 39, 2)))))
+    return resolved
+
+
+def set_search_params(index, index_type, params):
+    """Apply the query-time knobs (nprobe, ef_search) to an index."""
+    if index_type == 'hnsw':
+        index.hnsw.efSearch = int(params['ef_search'])
+    elif index_type in ('ivf', 'ivfpq'):
+        faiss.extract_index_ivf(index).nprobe = int(params['nprobe'])
+
+
+def build_index(vectors, index_type='flat', params=None, train_size=50000, seed=0):
+    """Build an inner-product FAISS index over L2-normalized vectors.
+
+    - ``flat``: exact brute-force scan
+    - ``fp16`` / ``sq8``: brute-force scan over float16 / 8-bit scalar-quantized codes
+    - ``pq``: brute-force scan over product-quantized codes
+    - ``hnsw``: graph index, tuned by ``M``, ``ef_construction`` and ``ef_search``
+    - ``ivf``: inverted lists over ``nlist`` k-means cells, ``nprobe`` scanned per query
+    - ``ivfpq``: IVF with product-quantized codes (``pq_m`` x ``pq_bits`` bits per vector)
+
+    Trained indexes learn on a random sample of at most ``train_size`` vectors.
+    Returns the index and the resolved parameters, which should be persisted
+    alongside it.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dimension = vectors.shape
+    params = resolve_params(index_type, params, n_vectors, dimension)
+    metric = faiss.METRIC_INNER_PRODUCT
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dimension)
+    elif index_type in ('fp16', 'sq8'):
+        quantizer_type = faiss.ScalarQuantizer.QT_fp16 if index_type == 'fp16' else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexScalarQuantizer(dimension, quantizer_type, metric)
+    elif index_type == 'pq':
+        index = faiss.IndexPQ(dimension, int(params['pq_m']), int(params['pq_bits']), metric)
+    elif index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, int(params['M']), metric)
+        index.hnsw.efConstruction = int(params['ef_construction'])
+    elif index_type == 'ivf':
+        index = faiss.IndexIVFFlat(faiss.IndexFlatIP(dimension), dimension, int(params['nlist']), metric)
+    else:
+        index = faiss.IndexIVFPQ(
+            faiss.IndexFlatIP(dimension), dimension, int(params['nlist']),
+            int(params['pq_m']), int(params['pq_bits']), metric
+        )
+
+    if not index.is_trained:
+        sample = vectors
+        if n_vectors > train_size:
+            rows = np.random.default_rng(seed).choice(n_vectors, train_size, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+
+    index.add(vectors)
+    set_search_params(index, index_type, params)
+    return index, params
+
+
+def search_parameters(index_type, params, allowed):
+    """Build FAISS search parameters restricted to the ids set in a boolean mask.
+
+    Returns (parameters, bitmap); the bitmap backs the selector and must stay
+    alive for the duration of the search. Returns (None, None) for index types
+    whose search does not accept a selector.
+    """
+    if index_type == 'pq':
+        return None, None
+
+    bitmap = np.packbits(np.asarray(allowed, dtype=bool), bitorder='little')
+    selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+    if index_type == 'hnsw':
+        parameters = faiss.SearchParametersHNSW(sel=selector, efSearch=int(params['ef_search']))
+    elif index_type in ('ivf', 'ivfpq'):
+        parameters = faiss.SearchParametersIVF(sel=selector, nprobe=int(params['nprobe']))
+    else:
+        parameters = faiss.SearchParameters(sel=selector)
+    return parameters, bitmap
+
+
+def flat_vectors(index):
+    """Return a zero-copy (n, d) view of the vectors stored in a flat index."""
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+
+class IndexVectors:
+    def __init__(self, index):
+        """Read-only row access to the vectors an index stores, without a separate copy.
+
+        Rows are reconstructed from the index on demand: exactly for HNSW and
+        IVF-flat storage, approximately for PQ codes.
+        """
+        self.index = index
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.make_direct_map()
+
+    @property
+    def shape(self):
+        return (self.index.ntotal, self.index.d)
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def __getitem__(self, rows):
+        ids = np.arange(*rows.indices(self.index.ntotal)) if isinstance(rows, slice) else np.asarray(rows, dtype=np.int64)
+        vectors = self.index.reconstruct_batch(np.atleast_1d(ids).astype(np.int64))
+        return vectors.reshape(ids.shape + (self.index.d,))
+
+    def __array__(self, dtype=None, copy=None):
+        vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        return vectors.astype(dtype) if dtype is not None else vectors
+
+
+class QuantizedVectors:
+    def __init__(self, codes, scale=None):
+        """Embeddings held as float16 codes, or int8 codes with a per-dimension scale.
+
+        Rows are dequantized to float32 only when indexed, so the full-precision
+        matrix never has to live in RAM.
+        """
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def from_float(cls, vectors, storage):
+        """Quantize float32 vectors to 'float16' or 'int8' storage."""
+        if storage == 'float16':
+            return cls(vectors.astype(np.float16))
+        if storage != 'int8':
+            raise ValueError(f"Unknown vector storage {storage!r}; expected one of {VECTOR_STORAGES}")
+
+        # Symmetric per-dimension scale so each column spans [-127, 127]
+        scale = np.abs(vectors).max(axis=0) / 127
+        scale[scale == 0] = 1
+        return cls(np.round(vectors / scale).astype(np.int8), scale.astype(np.float32))
+
+    @property
+    def storage(self):
+        return 'int8' if self.scale is not None else 'float16'
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        vectors = np.asarray(self.codes[rows], dtype=np.float32)
+        return vectors * self.scale if self.scale is not None else vectors
+
+    def __array__(self, dtype=None, copy=None):
+        vectors = self[:]
+        return vectors.astype(dtype) if dtype is not None else vectors
+
+
+def rescore(vectors, query, candidates, top_k):
+    """Re-rank candidate ids by their exact inner product with the query."""
+    # Sorted ids keep reads from memory-mapped vectors sequential
+    candidates = np.unique(candidates[candidates >= 0])
+    scores = np.asarray(vectors[candidates], dtype=np.float32) @ np.asarray(query, dtype=np.float32).ravel()
+    order = np.argsort(-scores, kind='stable')[:top_k]
+    return candidates[order], scores[order]
+
+
+def exact_neighbours(vectors, queries, top_k, block_size=64):
+    """Exact top-k inner-product neighbours, scoring queries in blocks to bound memory."""
+    queries = np.asarray(queries, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    neighbours = np.zeros((len(queries), top_k), dtype=np.int64)
+    for start in range(0, len(queries), block_size):
+        scores = queries[start:start + block_size] @ vectors.T
+        top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+        neighbours[start:start + block_size] = np.take_along_axis(top, order, axis=1)
+    return neighbours
+
+
+def recall_at_k(index, vectors, queries, top_k=10):
+    """Share of the exact top-k neighbours that the index also returns."""
+    top_k = min(top_k, len(vectors))
+    exact = exact_neighbours(vectors, queries, top_k)
+    _, found = index.search(np.ascontiguousarray(queries, dtype=np.float32), top_k)
+    hits = sum(len(np.intersect1d(a, b)) for a, b in zip(exact, found))
+    return hits / exact.size